@@ -0,0 +1,159 @@
+"""
+Offline benchmark of API client against local MockCryptoPayServer.
+Reports requests/sec, p50/p99 latency and peak memory per call for each API method and transport mode.
+
+Usage: python benchmarks/bench_api.py [--calls 500] [--latency 0] [--error-rate 0] [--modes sync,threads,async] [--methods getMe,getInvoices]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import requests
+from pyCryptoPayAPI import pyCryptoPayAPI, pyCryptoPayException
+from pyCryptoPayAPI.mock_server import MockCryptoPayServer
+
+try:
+    from pyCryptoPayAPI import AsyncCryptoPayAPI
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+THREADS = 8
+ASYNC_CONCURRENCY = 50
+_spend_ids = count()
+
+# API method -> call(client) returning result or coroutine
+METHODS = {
+    "getMe": lambda client: client.get_me(),
+    "createInvoice": lambda client: client.create_invoice("TON", "1.5", description = "Benchmark", payload = "bench"),
+    "getInvoices": lambda client: client.get_invoices(count = 100, return_items = True),
+    "transfer": lambda client: client.transfer(1, "USDT", "0.01", "bench-{}".format(next(_spend_ids))),
+    "getBalance": lambda client: client.get_balance(),
+    "getExchangeRates": lambda client: client.get_exchange_rates(),
+}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0
+
+
+def timed(func, client):
+    started = time.perf_counter()
+    try:
+        func(client)
+        error = False
+    except pyCryptoPayException:
+        error = True
+    return time.perf_counter() - started, error
+
+
+async def timed_async(func, client, semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            await func(client)
+            error = False
+        except pyCryptoPayException:
+            error = True
+        return time.perf_counter() - started, error
+
+
+def run_sync(client, func, calls):
+    return [timed(func, client) for _ in range(calls)]
+
+
+def run_threads(client, func, calls):
+    with ThreadPoolExecutor(max_workers = THREADS) as executor:
+        return list(executor.map(lambda _: timed(func, client), range(calls)))
+
+
+def run_async(url, func, calls):
+    async def main():
+        async with AsyncCryptoPayAPI("bench", result_as_class = True, api_url = url) as client:
+            semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+            return await asyncio.gather(*[timed_async(func, client, semaphore) for _ in range(calls)])
+    return asyncio.run(main())
+
+
+def memory_per_call(client, func, calls):
+    # Average peak of memory allocated during a single call
+    tracemalloc.start()
+    total = 0
+    for _ in range(calls):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            func(client)
+        except pyCryptoPayException:
+            pass
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / calls
+
+
+class NoPoolSession:
+    """Previous behaviour: requests.get with new connection for every request."""
+    def get(self, *args, **kwargs):
+        return requests.get(*args, **kwargs)
+
+    def close(self):
+        pass
+
+
+def make_client(url, mode):
+    session = NoPoolSession() if mode == "sync-nopool" else None
+    return pyCryptoPayAPI("bench", result_as_class = True, api_url = url, session = session, pool_size = THREADS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type = int, default = 500)
+    parser.add_argument("--latency", type = float, default = 0, help = "Mock server latency, seconds")
+    parser.add_argument("--error-rate", type = float, default = 0, help = "Share of injected HTTP 500 errors")
+    parser.add_argument("--modes", default = "sync,sync-nopool,threads,async")
+    parser.add_argument("--methods", default = ",".join(METHODS))
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    if "async" in modes and aiohttp is None:
+        print("aiohttp is not installed, skipping async mode")
+        modes.remove("async")
+
+    with MockCryptoPayServer(latency = args.latency, error_rate = args.error_rate) as server:
+        # Some invoices to list
+        seed = make_client(server.url, "sync")
+        for _ in range(100):
+            seed.create_invoice("TON", "1")
+        print("{:<18}{:<13}{:>10}{:>10}{:>10}{:>8}{:>12}".format("method", "mode", "req/s", "p50 ms", "p99 ms", "errors", "KB/call"))
+        for method in args.methods.split(","):
+            func = METHODS[method]
+            for mode in modes:
+                client = None if mode == "async" else make_client(server.url, mode)
+                started = time.perf_counter()
+                if mode == "async":
+                    results = run_async(server.url, func, args.calls)
+                elif mode == "threads":
+                    results = run_threads(client, func, args.calls)
+                else:
+                    results = run_sync(client, func, args.calls)
+                elapsed = time.perf_counter() - started
+                latencies = [latency for latency, _ in results]
+                errors = sum(1 for _, error in results if error)
+                memory = memory_per_call(client, func, max(1, args.calls // 10)) if client else float("nan")
+                print("{:<18}{:<13}{:>10.0f}{:>10.2f}{:>10.2f}{:>8}{:>12.1f}".format(
+                    method, mode, len(results) / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+                    errors, memory / 1024))
+                if client:
+                    client.close()
+        seed.close()
+
+
+if __name__ == "__main__":
+    main()
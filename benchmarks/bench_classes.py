@@ -0,0 +1,68 @@
+"""
+Compare memory and construction time of result classes with the previous dict-based ones.
+
+Usage: python benchmarks/bench_classes.py [count]
+"""
+import sys
+import os
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pyCryptoPayAPI import Invoice, Transfer, Check
+
+
+INVOICE = {
+    "invoice_id": 123456, "hash": "IVabcdefgh", "currency_type": "crypto", "asset": "TON", "amount": "125.5",
+    "bot_invoice_url": "https://t.me/CryptoBot?start=IVabcdefgh", "mini_app_invoice_url": "https://t.me/CryptoBot/app?startapp=invoice-IVabcdefgh",
+    "web_app_invoice_url": "https://app.send.tg/invoices/IVabcdefgh", "description": "Order #1",
+    "status": "paid", "created_at": "2024-05-01T10:00:00.000Z", "allow_comments": True, "allow_anonymous": True,
+    "paid_asset": "TON", "paid_amount": "125.5", "fee_asset": "TON", "fee_amount": "1.2551", "fee_in_usd": "6.5",
+    "paid_usd_rate": "5.2", "paid_at": "2024-05-01T10:05:00.000Z", "paid_anonymously": False, "payload": "user:42",
+}
+TRANSFER = {
+    "transfer_id": 1, "spend_id": "payout-1", "user_id": 42, "asset": "USDT", "amount": "10",
+    "status": "completed", "completed_at": "2024-05-01T10:00:00.000Z", "comment": "Thanks",
+}
+CHECK = {
+    "check_id": 1, "hash": "CQabcdefgh", "asset": "USDT", "amount": "10", "bot_check_url": "https://t.me/CryptoBot?start=CQabcdefgh",
+    "status": "active", "created_at": "2024-05-01T10:00:00.000Z",
+}
+
+
+def make_legacy(cls):
+    """Previous implementation: declared fields set to None in __dict__, then data applied with setattr."""
+    fields = cls._fields
+
+    class Legacy:
+        def __init__(self, data):
+            for key in fields:
+                setattr(self, key, None)
+            for key, value in data.items():
+                setattr(self, key, value)
+
+    Legacy.__name__ = "Legacy" + cls.__name__
+    return Legacy
+
+
+def measure(cls, data, count):
+    tracemalloc.start()
+    objects = [cls(data) for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    seconds = min(timeit.repeat(lambda: cls(data), number = count, repeat = 3))
+    return size / count, seconds / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("{:<16}{:>14}{:>14}".format("class", "bytes/object", "us/object"))
+    for cls, data in ((Invoice, INVOICE), (Transfer, TRANSFER), (Check, CHECK)):
+        for klass in (make_legacy(cls), cls):
+            size, micros = measure(klass, data, count)
+            print("{:<16}{:>14.0f}{:>14.2f}".format(klass.__name__, size, micros))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Measure decode + model building cost of one getInvoices page for each JSON backend.
+
+Usage: python benchmarks/bench_decode.py [items_per_page]
+"""
+import sys
+import os
+import json
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pyCryptoPayAPI import Invoice
+from pyCryptoPayAPI.json_backend import JSON_BACKENDS
+from bench_classes import INVOICE
+
+
+def make_page(count):
+    items = [dict(INVOICE, invoice_id = INVOICE["invoice_id"] + i) for i in range(count)]
+    return json.dumps({"ok": True, "result": {"items": items}}).encode()
+
+
+def previous_path(body):
+    # What requests.Response.json() did: decode bytes to text, then stdlib json
+    return json.loads(body.decode("utf-8"))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    body = make_page(count)
+    number = 50
+    print("page: {} invoices, {} KB".format(count, len(body) // 1024))
+    print("{:<22}{:>12}{:>16}".format("backend", "decode ms", "decode+class ms"))
+    backends = [("previous (text+json)", previous_path)] + sorted(JSON_BACKENDS.items())
+    for name, loads in backends:
+        decode = min(timeit.repeat(lambda: loads(body), number = number, repeat = 3)) / number
+        full = min(timeit.repeat(
+            lambda: [Invoice(item) for item in loads(body)["result"]["items"]], number = number, repeat = 3)) / number
+        print("{:<22}{:>12.2f}{:>16.2f}".format(name, decode * 1000, full * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,20 @@
 from .classes import *
+from .params import PARAM_SCHEMAS, ParamError, check_params
+from .rates import *
+from .stats import *
+from .cache import *
+from .shared import *
+from .ratelimit import *
+from .metrics import RequestMetrics
+from .singleflight import *
 from .api import *
+from .async_api import *
+from .retry import *
+from .ledger import *
+from .payouts import *
+from .pool import *
+from .watcher import *
+from .mock_server import MockCryptoPayServer
+from .mirror import *
+from .export import *
+from .webhook import *
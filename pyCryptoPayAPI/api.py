@@ -1,26 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from .classes import *
+from .rates import ExchangeRateTable
+from .json_backend import get_json_loads
+from .metrics import params_size, notify_before, notify_after
+from .params import ASSETS, ParamError, check_params
+from .bulk import run_bulk
 
 MAIN_API_URL = "https://pay.crypt.bot/api/"
 TEST_API_URL = "https://testnet-pay.crypt.bot/api/"
+MAX_PAGE_SIZE = 1000
 
 # noinspection PyPep8Naming
 class pyCryptoPayException(Exception):
-    def __init__(self, code, name, message, full_error = ""):
+    def __init__(self, code, name, message, full_error = "", http_status = None):
         self.code = code
         self.name = name
         self.message = message
         self.full_error = full_error
+        self.http_status = http_status
         super().__init__(self.message)
 
 
+def _check_response(resp, print_errors = False, http_status = None):
+    """
+    Check the decoded API response and raise pyCryptoPayException on error.
+    Shared by sync and async clients.
+    """
+    if not resp:
+        message = "None request response"
+        if print_errors:
+            print(message)
+        raise pyCryptoPayException(-4, "NONE", message, http_status = http_status)
+    elif not resp.get("ok"):
+        if print_errors:
+            print("Response: {}".format(resp))
+        if resp.get("error"):
+            raise pyCryptoPayException(
+                resp["error"].get("code", 1),
+                resp["error"].get("name", "---"),
+                resp["error"].get("message", resp["error"].get("description", "No info")),
+                full_error = str(resp["error"]),
+                http_status = http_status)
+        else:
+            raise pyCryptoPayException(1, "NO_INFO", "No error info provided", http_status = http_status)
+    else:
+        return resp
+
+
+def _validate_params(method, data):
+    """
+    Validate params locally, raising pyCryptoPayException like the server would.
+    Shared by sync and async clients.
+    """
+    try:
+        return check_params(method, data)
+    except ParamError as e:
+        raise pyCryptoPayException(400, e.name, e.message)
+
+
+def _is_overload_status(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def _is_overload_response(resp):
+    return isinstance(resp, dict) and isinstance(resp.get("error"), dict) and resp["error"].get("code") == 429
+
+
 # noinspection PyPep8Naming
 class pyCryptoPayAPI:
     """
     Crypto Pay API Client
     """
 
-    def __init__(self, api_token, result_as_class = None, test_net = False, print_errors = False, timeout = None):
+    def __init__(self, api_token, result_as_class = None, test_net = False, print_errors = False, timeout = None, pool_size = 10, session = None, cache = None, rate_limiter = None, retry_policy = None, transfer_journal = None, json_backend = None, api_url = None, request_hooks = None, single_flight = None, strict_params = False):
         """
         Create the pyCryptoPayAPI instance.
 
@@ -29,60 +84,143 @@ class pyCryptoPayAPI:
         :param test_net: (Optional) Use testnet instead of mainnet
         :param print_errors: (Optional) Print dumps on request errors
         :param timeout: (Optional) Request timeout
+        :param pool_size: (Optional) Max number of keep-alive connections kept in the pool. Default is 10.
+        :param session: (Optional) Existing requests.Session to use. It is not closed by close().
+        :param cache: (Optional) TTLCache instance to cache results of read-only methods (getExchangeRates, getCurrencies by default).
+        :param rate_limiter: (Optional) RateLimiter instance to limit request rate and concurrency. May be shared by several clients.
+        :param retry_policy: (Optional) RetryPolicy instance to retry temporary failures of idempotent methods.
+        :param transfer_journal: (Optional) TransferJournal instance to skip already completed transfers when a payout run is repeated.
+        :param json_backend: (Optional) JSON decoder: "json", "orjson" or callable. Defaults to orjson if installed.
+        :param api_url: (Optional) Custom API URL (e.g. local mock server), overrides test_net.
+        :param request_hooks: (Optional) List of hooks called around each HTTP request, e.g. RequestMetrics instance.
+        :param single_flight: (Optional) SingleFlight instance to share one request between identical concurrent read-only calls. May be shared by several clients.
+        :param strict_params: (Optional) Validate method params locally and raise pyCryptoPayException before sending invalid request. Default is False.
         """
         self.api_token = api_token
         self.result_as_class = result_as_class if result_as_class else False
         self.test_net = test_net
         self.print_errors = print_errors
         self.timeout = timeout
+        self.pool_size = pool_size
+        self._own_session = session is None
+        self.session = session if session is not None else self._create_session(pool_size)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.transfer_journal = transfer_journal
+        self.json_loads = get_json_loads(json_backend)
+        self.api_url = api_url
+        self.request_hooks = list(request_hooks) if request_hooks else []
+        self.single_flight = single_flight
+        self.strict_params = strict_params
         if result_as_class is None:
             print("Deprecation warning! The 'result_as_class' parameter should be set to False or True, default behaviour will be changed to 'True' in future versions!")
 
+    @staticmethod
+    def _create_session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    def close(self):
+        """
+        Non-API method
+        Close pooled connections. The client can not be used after that.
+        """
+        if self._own_session and self.session is not None:
+            self.session.close()
+        self.session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
 
     def __request(self, method, **kwargs):
         if kwargs:
             data = dict(kwargs)
         else:
             data = {}
+        if self.strict_params:
+            data = _validate_params(method, data)
+
+        if self.cache is not None and self.cache.is_cached(method):
+            return self.cache.get_or_load(method, data, lambda: self.__send_coalesced(method, data))
+        return self.__send_coalesced(method, data)
+
+    def __send_coalesced(self, method, data):
+        if self.single_flight is not None and method in self.single_flight.methods:
+            key = self.single_flight.make_key((self.api_token, self.api_url, self.test_net), method, data)
+            return self.single_flight.call(key, lambda: self.__send_with_retry(method, data))
+        return self.__send_with_retry(method, data)
+
+    def __send_with_retry(self, method, data):
+        if self.retry_policy is not None:
+            return self.retry_policy.call(method, lambda: self.__send(method, data))
+        return self.__send(method, data)
+
+    def __send(self, method, data):
+        if not self.request_hooks:
+            return self.__get(method, data)
+        size = params_size(data)
+        notify_before(self.request_hooks, method, size)
+        started = time.perf_counter()
+        status = None
+        error_code = None
+        try:
+            result = self.__get(method, data)
+            # Successful responses always come with HTTP 200
+            status = 200
+            return result
+        except pyCryptoPayException as pe:
+            status = pe.http_status
+            error_code = pe.code
+            raise
+        finally:
+            notify_after(self.request_hooks, method, size, time.perf_counter() - started, status, error_code)
+
+    def __get(self, method, data):
+        if self.session is None:
+            raise pyCryptoPayException(-5, "CLOSED", "Client is closed")
 
         headers = {
             "Crypto-Pay-API-Token": self.api_token
         }
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        overloaded = False
+        status = None
         try:
-            resp = requests.get(
-                (TEST_API_URL if self.test_net else MAIN_API_URL) + method,
+            response = self.session.get(
+                (self.api_url or (TEST_API_URL if self.test_net else MAIN_API_URL)) + method,
                 params=data,
                 headers = headers,
                 timeout=self.timeout
-            ).json()
+            )
+            status = response.status_code
+            overloaded = _is_overload_status(status)
+            resp = self.json_loads(response.content)
+            overloaded = overloaded or _is_overload_response(resp)
         except ValueError as ve:
             message = "Response decode failed: {}".format(ve)
             if self.print_errors:
                 print(message)
-            raise pyCryptoPayException(-2, "JSON", message)
+            raise pyCryptoPayException(-2, "JSON", message, http_status = status)
         except Exception as e:
+            overloaded = isinstance(e, requests.Timeout)
             message = "Request unknown exception: {}".format(e)
             if self.print_errors:
                 print(message)
             raise pyCryptoPayException(-3, "UNKNOWN", message)
-        if not resp:
-            message = "None request response"
-            if self.print_errors:
-                print(message)
-            raise pyCryptoPayException(-4, "NONE", message)
-        elif not resp.get("ok"):
-            if self.print_errors:
-                print("Response: {}".format(resp))
-            if resp.get("error"):
-                raise pyCryptoPayException(
-                    resp["error"].get("code", 1),
-                    resp["error"].get("name", "---"),
-                    resp["error"].get("message", resp["error"].get("description", "No info")),
-                    full_error = str(resp["error"]))
-            else:
-                raise pyCryptoPayException(1, "NO_INFO", "No error info provided")
-        else:
-            return resp
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(overloaded)
+        return _check_response(resp, self.print_errors, status)
 
     @staticmethod
     def get_assets():
@@ -90,7 +228,7 @@ class pyCryptoPayAPI:
         Non-API method
         Returns the list of assets supported by Crypto Pay API.
         """
-        return ["USDT", "TON", "BTC", "ETH", "LTC", "BNB", "TRX", "USDC"]
+        return list(ASSETS)
 
     def get_me(self):
         """
@@ -210,9 +348,19 @@ class pyCryptoPayAPI:
             params["comment"] = comment
         if disable_send_notification is not None:
             params["disable_send_notification"] = disable_send_notification
-        result = self.__request(method, **params).get("result")
+        if self.transfer_journal is not None:
+            result = self.transfer_journal.run(
+                spend_id,
+                lambda: self.__request(method, **params).get("result"),
+                lambda: self.__find_transfer(spend_id))
+        else:
+            result = self.__request(method, **params).get("result")
         return Transfer(result) if self.result_as_class else result
 
+    def __find_transfer(self, spend_id):
+        items = (self.__request("getTransfers", spend_id = spend_id).get("result") or {}).get("items")
+        return items[0] if items else None
+
     def get_invoices(
             self, asset = None, fiat = None, invoice_ids = None, status = None, offset = None, count  = None, return_items = False
     ):
@@ -243,10 +391,7 @@ class pyCryptoPayAPI:
             params["offset"] = offset
         if count:
             params["count"] = count
-        if params:
-            result = self.__request(method, **params).get("result")
-        else:
-            result = self.__request(method).get("result")
+        result = self.__request(method, **params).get("result")
         if not result:
             return [] if return_items else None
         elif self.result_as_class:
@@ -283,10 +428,7 @@ class pyCryptoPayAPI:
             params["offset"] = offset
         if count:
             params["count"] = count
-        if params:
-            result = self.__request(method, **params).get("result")
-        else:
-            result = self.__request(method).get("result")
+        result = self.__request(method, **params).get("result")
         if not result:
             return [] if return_items else None
         elif self.result_as_class:
@@ -323,10 +465,7 @@ class pyCryptoPayAPI:
             params["offset"] = offset
         if count:
             params["count"] = count
-        if params:
-            result = self.__request(method, **params).get("result")
-        else:
-            result = self.__request(method).get("result")
+        result = self.__request(method, **params).get("result")
         if not result:
             return [] if return_items else None
         elif self.result_as_class:
@@ -336,6 +475,181 @@ class pyCryptoPayAPI:
         else:
             return result
 
+    def _iter_pages(self, fetch, page_size, prefetch):
+        # fetch(offset, count) returns list of items; stop on short page
+        executor = ThreadPoolExecutor(max_workers = 1) if prefetch else None
+        try:
+            offset = 0
+            future = executor.submit(fetch, offset, page_size) if executor else None
+            while True:
+                items = future.result() if executor else fetch(offset, page_size)
+                offset += len(items)
+                last_page = len(items) < page_size
+                if executor and not last_page:
+                    future = executor.submit(fetch, offset, page_size)
+                yield from items
+                if last_page:
+                    break
+        finally:
+            if executor:
+                executor.shutdown(wait = False)
+
+    def iter_invoices(
+            self, asset = None, fiat = None, invoice_ids = None, status = None, page_size = MAX_PAGE_SIZE, prefetch = False
+    ):
+        """
+        Non-API method
+        Iterate over all invoices, requesting pages lazily via getInvoices.
+
+        :param asset: (String) Optional. Same as in get_invoices.
+        :param fiat: (String) Optional. Same as in get_invoices.
+        :param invoice_ids: (String) Optional. Same as in get_invoices.
+        :param status: (String) Optional. Same as in get_invoices.
+        :param page_size: (Number) Optional. Number of invoices requested per call, 1-1000. Default is 1000.
+        :param prefetch: (Boolean) Optional. Request the next page in background while the current one is consumed. Default is False.
+        :return: Generator of invoices (dicts or Invoice instances).
+        """
+        return self._iter_pages(
+            lambda offset, count: self.get_invoices(
+                asset = asset, fiat = fiat, invoice_ids = invoice_ids, status = status,
+                offset = offset, count = count, return_items = True),
+            page_size, prefetch)
+
+    def iter_checks(
+            self, asset = None, check_ids = None, status = None, page_size = MAX_PAGE_SIZE, prefetch = False
+    ):
+        """
+        Non-API method
+        Iterate over all checks, requesting pages lazily via getChecks.
+
+        :param asset: (String) Optional. Same as in get_checks.
+        :param check_ids: (String) Optional. Same as in get_checks.
+        :param status: (String) Optional. Same as in get_checks.
+        :param page_size: (Number) Optional. Number of checks requested per call, 1-1000. Default is 1000.
+        :param prefetch: (Boolean) Optional. Request the next page in background while the current one is consumed. Default is False.
+        :return: Generator of checks (dicts or Check instances).
+        """
+        return self._iter_pages(
+            lambda offset, count: self.get_checks(
+                asset = asset, check_ids = check_ids, status = status,
+                offset = offset, count = count, return_items = True),
+            page_size, prefetch)
+
+    def iter_transfers(
+            self, asset = None, transfer_ids = None, spend_id = None, page_size = MAX_PAGE_SIZE, prefetch = False
+    ):
+        """
+        Non-API method
+        Iterate over all transfers, requesting pages lazily via getTransfers.
+
+        :param asset: (String) Optional. Same as in get_transfers.
+        :param transfer_ids: (String) Optional. Same as in get_transfers.
+        :param spend_id: (String) Optional. Same as in get_transfers.
+        :param page_size: (Number) Optional. Number of transfers requested per call, 1-1000. Default is 1000.
+        :param prefetch: (Boolean) Optional. Request the next page in background while the current one is consumed. Default is False.
+        :return: Generator of transfers (dicts or Transfer instances).
+        """
+        return self._iter_pages(
+            lambda offset, count: self.get_transfers(
+                asset = asset, transfer_ids = transfer_ids, spend_id = spend_id,
+                offset = offset, count = count, return_items = True),
+            page_size, prefetch)
+
+    @staticmethod
+    def _split_ids(ids, chunk_size):
+        ids = list(dict.fromkeys(str(item_id) for item_id in ids))
+        return [",".join(ids[i:i + chunk_size]) for i in range(0, len(ids), chunk_size)]
+
+    @staticmethod
+    def _index_items(items, id_key):
+        return {(item[id_key] if isinstance(item, dict) else getattr(item, id_key)): item for item in items}
+
+    def _get_by_ids(self, fetch, id_key, ids, chunk_size, max_workers):
+        # fetch(ids_string, count) returns list of items
+        chunks = self._split_ids(ids, chunk_size)
+        result = {}
+        if not chunks:
+            return result
+        with ThreadPoolExecutor(max_workers = min(max_workers, len(chunks))) as executor:
+            for items in executor.map(lambda chunk: fetch(chunk, chunk_size), chunks):
+                result.update(self._index_items(items, id_key))
+        return result
+
+    def get_invoices_by_ids(self, invoice_ids, chunk_size = MAX_PAGE_SIZE, max_workers = 4):
+        """
+        Non-API method
+        Get any number of invoices by ID. IDs are split into chunks requested in parallel via getInvoices.
+
+        :param invoice_ids: (Iterable) Invoice IDs.
+        :param chunk_size: (Number) Optional. Number of IDs per request, 1-1000. Default is 1000.
+        :param max_workers: (Number) Optional. Max number of parallel requests. Default is 4.
+        :return: Dict of invoices (dicts or Invoice instances) keyed by invoice_id. Unknown IDs are absent.
+        """
+        return self._get_by_ids(
+            lambda ids, count: self.get_invoices(invoice_ids = ids, count = count, return_items = True),
+            "invoice_id", invoice_ids, chunk_size, max_workers)
+
+    def get_checks_by_ids(self, check_ids, chunk_size = MAX_PAGE_SIZE, max_workers = 4):
+        """
+        Non-API method
+        Get any number of checks by ID. IDs are split into chunks requested in parallel via getChecks.
+
+        :param check_ids: (Iterable) Check IDs.
+        :param chunk_size: (Number) Optional. Number of IDs per request, 1-1000. Default is 1000.
+        :param max_workers: (Number) Optional. Max number of parallel requests. Default is 4.
+        :return: Dict of checks (dicts or Check instances) keyed by check_id. Unknown IDs are absent.
+        """
+        return self._get_by_ids(
+            lambda ids, count: self.get_checks(check_ids = ids, count = count, return_items = True),
+            "check_id", check_ids, chunk_size, max_workers)
+
+    def get_transfers_by_ids(self, transfer_ids, chunk_size = MAX_PAGE_SIZE, max_workers = 4):
+        """
+        Non-API method
+        Get any number of transfers by ID. IDs are split into chunks requested in parallel via getTransfers.
+
+        :param transfer_ids: (Iterable) Transfer IDs.
+        :param chunk_size: (Number) Optional. Number of IDs per request, 1-1000. Default is 1000.
+        :param max_workers: (Number) Optional. Max number of parallel requests. Default is 4.
+        :return: Dict of transfers (dicts or Transfer instances) keyed by transfer_id. Unknown IDs are absent.
+        """
+        return self._get_by_ids(
+            lambda ids, count: self.get_transfers(transfer_ids = ids, count = count, return_items = True),
+            "transfer_id", transfer_ids, chunk_size, max_workers)
+
+    def create_invoices_bulk(self, invoices, max_workers = 8):
+        """
+        Non-API method
+        Create many invoices in parallel.
+
+        :param invoices: (Iterable) Dicts of create_invoice parameters.
+        :param max_workers: (Number) Optional. Max number of parallel requests. Default is 8. Keep pool_size not less than this.
+        :return: Generator of (params, invoice, exception) tuples in order of completion. Exception is None on success, invoice is None on failure. Errors of one item (pyCryptoPayException, TypeError for bad params, ...) do not stop the others.
+        """
+        return run_bulk(lambda params: self.create_invoice(**params), invoices, max_workers)
+
+    def delete_invoices_bulk(self, invoice_ids, max_workers = 8):
+        """
+        Non-API method
+        Delete many invoices in parallel.
+
+        :param invoice_ids: (Iterable) Invoice IDs.
+        :param max_workers: (Number) Optional. Max number of parallel requests. Default is 8. Keep pool_size not less than this.
+        :return: Generator of (invoice_id, result, exception) tuples in order of completion.
+        """
+        return run_bulk(self.delete_invoice, invoice_ids, max_workers)
+
+    def delete_checks_bulk(self, check_ids, max_workers = 8):
+        """
+        Non-API method
+        Delete many checks in parallel.
+
+        :param check_ids: (Iterable) Check IDs.
+        :param max_workers: (Number) Optional. Max number of parallel requests. Default is 8. Keep pool_size not less than this.
+        :return: Generator of (check_id, result, exception) tuples in order of completion.
+        """
+        return run_bulk(self.delete_check, check_ids, max_workers)
+
     def get_balance(self):
         """
         getBalance method
@@ -368,6 +682,17 @@ class pyCryptoPayAPI:
         else:
             return result
 
+    def get_exchange_rate_table(self, pivots = ("USD", "USDT")):
+        """
+        Non-API method
+        Get exchange rates as ExchangeRateTable with O(1) lookups by (source, target) pair.
+
+        :param pivots: (Optional) Currencies to try first when deriving cross rates. Default is ("USD", "USDT").
+        :return: Returns ExchangeRateTable.
+        """
+        result = self.__request("getExchangeRates").get("result")
+        return ExchangeRateTable(result or [], pivots = pivots)
+
     def get_currencies(self):
         """
         getCurrencies method
@@ -0,0 +1,581 @@
+import asyncio
+import time
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+from .classes import *
+from .rates import ExchangeRateTable
+from .json_backend import get_json_loads
+from .metrics import params_size, notify_before, notify_after
+from .bulk import run_bulk_async
+from .api import MAIN_API_URL, TEST_API_URL, MAX_PAGE_SIZE, pyCryptoPayAPI, pyCryptoPayException, _check_response, _validate_params, _is_overload_status, _is_overload_response
+
+
+class AsyncCryptoPayAPI:
+    """
+    Crypto Pay API Client (asyncio)
+    Requires aiohttp: pip install pyCryptoPayAPI[async]
+    """
+
+    def __init__(self, api_token, result_as_class = None, test_net = False, print_errors = False, timeout = None, pool_size = 100, session = None, cache = None, rate_limiter = None, retry_policy = None, transfer_journal = None, json_backend = None, api_url = None, request_hooks = None, single_flight = None, strict_params = False):
+        """
+        Create the AsyncCryptoPayAPI instance.
+
+        :param api_token: API token obtained via @CryptoBot
+        :param result_as_class: (Optional) If True, returns instances of classes, otherwise returns raw data
+        :param test_net: (Optional) Use testnet instead of mainnet
+        :param print_errors: (Optional) Print dumps on request errors
+        :param timeout: (Optional) Request timeout
+        :param pool_size: (Optional) Max number of simultaneous connections in the pool. Default is 100.
+        :param session: (Optional) Existing aiohttp.ClientSession to use. It is not closed by close().
+        :param cache: (Optional) TTLCache or SharedTTLCache instance to cache results of read-only methods (getExchangeRates, getCurrencies by default).
+        :param rate_limiter: (Optional) RateLimiter instance to limit request rate and concurrency. May be shared by several clients.
+        :param retry_policy: (Optional) RetryPolicy instance to retry temporary failures of idempotent methods.
+        :param transfer_journal: (Optional) TransferJournal instance to skip already completed transfers when a payout run is repeated.
+        :param json_backend: (Optional) JSON decoder: "json", "orjson" or callable. Defaults to orjson if installed.
+        :param api_url: (Optional) Custom API URL (e.g. local mock server), overrides test_net.
+        :param request_hooks: (Optional) List of hooks called around each HTTP request, e.g. RequestMetrics instance.
+        :param single_flight: (Optional) SingleFlight instance to share one request between identical concurrent read-only calls. May be shared by several clients.
+        :param strict_params: (Optional) Validate method params locally and raise pyCryptoPayException before sending invalid request. Default is False.
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncCryptoPayAPI requires aiohttp. Install it with: pip install pyCryptoPayAPI[async]")
+        self.api_token = api_token
+        self.result_as_class = result_as_class if result_as_class else False
+        self.test_net = test_net
+        self.print_errors = print_errors
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._own_session = session is None
+        self.session = session
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.transfer_journal = transfer_journal
+        self.json_loads = get_json_loads(json_backend)
+        self.api_url = api_url
+        self.request_hooks = list(request_hooks) if request_hooks else []
+        self.single_flight = single_flight
+        self.strict_params = strict_params
+        self._closed = False
+        if result_as_class is None:
+            print("Deprecation warning! The 'result_as_class' parameter should be set to False or True, default behaviour will be changed to 'True' in future versions!")
+
+    def _get_session(self):
+        # ClientSession has to be created inside the running event loop, so do it on first request
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(limit = self.pool_size),
+                timeout = aiohttp.ClientTimeout(total = self.timeout))
+        return self.session
+
+    async def close(self):
+        """
+        Non-API method
+        Close pooled connections. The client can not be used after that.
+        """
+        if self._own_session and self.session is not None:
+            await self.session.close()
+        self.session = None
+        self._closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def __request(self, method, **kwargs):
+        if self.strict_params:
+            # Validated params are serialized, booleans included
+            data = _validate_params(method, kwargs)
+        elif kwargs:
+            # Serialize like requests does: yarl rejects booleans and truncates Decimal amounts to int
+            data = {key: (str(value).lower() if isinstance(value, bool) else value if isinstance(value, str) else str(value)) for key, value in kwargs.items()}
+        else:
+            data = {}
+
+        if self.cache is not None and self.cache.is_cached(method):
+            return await self.cache.get_or_load_async(method, data, lambda: self.__send_coalesced(method, data))
+        return await self.__send_coalesced(method, data)
+
+    async def __send_coalesced(self, method, data):
+        if self.single_flight is not None and method in self.single_flight.methods:
+            key = self.single_flight.make_key((self.api_token, self.api_url, self.test_net), method, data)
+            return await self.single_flight.call_async(key, lambda: self.__send_with_retry(method, data))
+        return await self.__send_with_retry(method, data)
+
+    async def __send_with_retry(self, method, data):
+        if self.retry_policy is not None:
+            return await self.retry_policy.call_async(method, lambda: self.__send(method, data))
+        return await self.__send(method, data)
+
+    async def __send(self, method, data):
+        if not self.request_hooks:
+            return await self.__get(method, data)
+        size = params_size(data)
+        notify_before(self.request_hooks, method, size)
+        started = time.perf_counter()
+        status = None
+        error_code = None
+        try:
+            result = await self.__get(method, data)
+            # Successful responses always come with HTTP 200
+            status = 200
+            return result
+        except pyCryptoPayException as pe:
+            status = pe.http_status
+            error_code = pe.code
+            raise
+        finally:
+            notify_after(self.request_hooks, method, size, time.perf_counter() - started, status, error_code)
+
+    async def __get(self, method, data):
+        if self._closed:
+            raise pyCryptoPayException(-5, "CLOSED", "Client is closed")
+
+        headers = {
+            "Crypto-Pay-API-Token": self.api_token
+        }
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async()
+        overloaded = False
+        status = None
+        try:
+            async with self._get_session().get(
+                (self.api_url or (TEST_API_URL if self.test_net else MAIN_API_URL)) + method,
+                params=data,
+                headers=headers
+            ) as response:
+                status = response.status
+                overloaded = _is_overload_status(status)
+                resp = self.json_loads(await response.read())
+                overloaded = overloaded or _is_overload_response(resp)
+        except ValueError as ve:
+            message = "Response decode failed: {}".format(ve)
+            if self.print_errors:
+                print(message)
+            raise pyCryptoPayException(-2, "JSON", message, http_status = status)
+        except Exception as e:
+            overloaded = isinstance(e, asyncio.TimeoutError)
+            message = "Request unknown exception: {}".format(e)
+            if self.print_errors:
+                print(message)
+            raise pyCryptoPayException(-3, "UNKNOWN", message)
+        finally:
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(overloaded)
+        return _check_response(resp, self.print_errors, status)
+
+    @staticmethod
+    def get_assets():
+        """
+        Non-API method
+        Returns the list of assets supported by Crypto Pay API.
+        """
+        return pyCryptoPayAPI.get_assets()
+
+    async def get_me(self):
+        """
+        getMe method
+        See pyCryptoPayAPI.get_me for details.
+        """
+        method = "getMe"
+        result = (await self.__request(method)).get("result")
+        return Me(result) if self.result_as_class else result
+
+    async def create_invoice(
+            self, asset = None, amount = 0,
+            description = None, hidden_message = None,
+            paid_btn_name = None, paid_btn_url = None, payload = None,
+            allow_comments = None, allow_anonymous = None,
+            expires_in = None, currency_type = None, fiat = None,
+            accepted_assets = None, swap_to = None
+    ):
+        """
+        createInvoice method
+        See pyCryptoPayAPI.create_invoice for details.
+        """
+        method = "createInvoice"
+        params = {
+            "amount": amount if amount else 0,
+        }
+        if currency_type:
+            params["currency_type"] = currency_type
+        if asset:
+            params["asset"] = asset
+        if fiat:
+            params["fiat"] = fiat
+        if accepted_assets:
+            params["accepted_assets"] = accepted_assets
+        if description:
+            params["description"] = description
+        if hidden_message:
+            params["hidden_message"] = hidden_message
+        if paid_btn_name:
+            params["paid_btn_name"] = paid_btn_name
+        if swap_to:
+            params["swap_to"] = swap_to
+        if paid_btn_url:
+            params["paid_btn_url"] = paid_btn_url
+        if payload:
+            params["payload"] = payload
+        if allow_comments is not None:
+            params["allow_comments"] = allow_comments
+        if allow_anonymous is not None:
+            params["allow_anonymous"] = allow_anonymous
+        if expires_in:
+            params["expires_in"] = expires_in
+        result = (await self.__request(method, **params)).get("result")
+        return Invoice(result) if self.result_as_class else result
+
+    async def delete_invoice(self, invoice_id):
+        """
+        deleteInvoice method
+        See pyCryptoPayAPI.delete_invoice for details.
+        """
+        method = "deleteInvoice"
+        params = {
+            "invoice_id": invoice_id
+        }
+        result = (await self.__request(method, **params)).get("result")
+        return result
+
+    async def transfer(
+            self, user_id, asset, amount, spend_id,
+            comment = None, disable_send_notification = None
+    ):
+        """
+        transfer method
+        See pyCryptoPayAPI.transfer for details.
+        """
+        method = "transfer"
+        params = {
+            "user_id": user_id,
+            "asset": asset,
+            "amount": amount,
+            "spend_id": spend_id,
+        }
+        if comment:
+            params["comment"] = comment
+        if disable_send_notification is not None:
+            params["disable_send_notification"] = disable_send_notification
+        if self.transfer_journal is not None:
+            result = await self.transfer_journal.run_async(
+                spend_id,
+                lambda: self.__transfer(params),
+                lambda: self.__find_transfer(spend_id))
+        else:
+            result = await self.__transfer(params)
+        return Transfer(result) if self.result_as_class else result
+
+    async def __transfer(self, params):
+        return (await self.__request("transfer", **params)).get("result")
+
+    async def __find_transfer(self, spend_id):
+        items = ((await self.__request("getTransfers", spend_id = spend_id)).get("result") or {}).get("items")
+        return items[0] if items else None
+
+    async def get_invoices(
+            self, asset = None, fiat = None, invoice_ids = None, status = None, offset = None, count = None, return_items = False
+    ):
+        """
+        getInvoices method
+        See pyCryptoPayAPI.get_invoices for details.
+        """
+        method = "getInvoices"
+        params = {}
+        if asset:
+            params["asset"] = asset
+        if fiat:
+            params["fiat"] = fiat
+        if invoice_ids:
+            params["invoice_ids"] = invoice_ids
+        if status:
+            params["status"] = status
+        if offset:
+            params["offset"] = offset
+        if count:
+            params["count"] = count
+        result = (await self.__request(method, **params)).get("result")
+        if not result:
+            return [] if return_items else None
+        elif self.result_as_class:
+            return [Invoice(item) for item in result.get("items", [])]
+        elif return_items:
+            return result.get("items")
+        else:
+            return result
+
+    async def get_checks(
+            self, asset = None, check_ids = None, status = None, offset = None, count = None, return_items = True
+    ):
+        """
+        getChecks method
+        See pyCryptoPayAPI.get_checks for details.
+        """
+        method = "getChecks"
+        params = {}
+        if asset:
+            params["asset"] = asset
+        if check_ids:
+            params["check_ids"] = check_ids
+        if status:
+            params["status"] = status
+        if offset:
+            params["offset"] = offset
+        if count:
+            params["count"] = count
+        result = (await self.__request(method, **params)).get("result")
+        if not result:
+            return [] if return_items else None
+        elif self.result_as_class:
+            return [Check(item) for item in result.get("items", [])]
+        elif return_items:
+            return result.get("items")
+        else:
+            return result
+
+    async def get_transfers(
+            self, asset = None, transfer_ids = None, spend_id = None, offset = None, count = None, return_items = True
+    ):
+        """
+        getTransfers method
+        See pyCryptoPayAPI.get_transfers for details.
+        """
+        method = "getTransfers"
+        params = {}
+        if asset:
+            params["asset"] = asset
+        if transfer_ids:
+            params["transfer_ids"] = transfer_ids
+        if spend_id:
+            params["spend_id"] = spend_id
+        if offset:
+            params["offset"] = offset
+        if count:
+            params["count"] = count
+        result = (await self.__request(method, **params)).get("result")
+        if not result:
+            return [] if return_items else None
+        elif self.result_as_class:
+            return [Transfer(item) for item in result.get("items", [])]
+        elif return_items:
+            return result.get("items")
+        else:
+            return result
+
+    async def _iter_pages(self, fetch, page_size, prefetch):
+        # fetch(offset, count) returns coroutine with list of items; stop on short page
+        offset = 0
+        task = asyncio.ensure_future(fetch(offset, page_size)) if prefetch else None
+        try:
+            while True:
+                items = (await task) if prefetch else (await fetch(offset, page_size))
+                offset += len(items)
+                last_page = len(items) < page_size
+                if prefetch and not last_page:
+                    task = asyncio.ensure_future(fetch(offset, page_size))
+                for item in items:
+                    yield item
+                if last_page:
+                    break
+        finally:
+            if task and not task.done():
+                task.cancel()
+
+    def iter_invoices(
+            self, asset = None, fiat = None, invoice_ids = None, status = None, page_size = MAX_PAGE_SIZE, prefetch = False
+    ):
+        """
+        Non-API method
+        Async generator version of pyCryptoPayAPI.iter_invoices.
+        """
+        return self._iter_pages(
+            lambda offset, count: self.get_invoices(
+                asset = asset, fiat = fiat, invoice_ids = invoice_ids, status = status,
+                offset = offset, count = count, return_items = True),
+            page_size, prefetch)
+
+    def iter_checks(
+            self, asset = None, check_ids = None, status = None, page_size = MAX_PAGE_SIZE, prefetch = False
+    ):
+        """
+        Non-API method
+        Async generator version of pyCryptoPayAPI.iter_checks.
+        """
+        return self._iter_pages(
+            lambda offset, count: self.get_checks(
+                asset = asset, check_ids = check_ids, status = status,
+                offset = offset, count = count, return_items = True),
+            page_size, prefetch)
+
+    def iter_transfers(
+            self, asset = None, transfer_ids = None, spend_id = None, page_size = MAX_PAGE_SIZE, prefetch = False
+    ):
+        """
+        Non-API method
+        Async generator version of pyCryptoPayAPI.iter_transfers.
+        """
+        return self._iter_pages(
+            lambda offset, count: self.get_transfers(
+                asset = asset, transfer_ids = transfer_ids, spend_id = spend_id,
+                offset = offset, count = count, return_items = True),
+            page_size, prefetch)
+
+    async def _get_by_ids(self, fetch, id_key, ids, chunk_size, max_workers):
+        # fetch(ids_string, count) returns coroutine with list of items
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def fetch_chunk(chunk):
+            async with semaphore:
+                return await fetch(chunk, chunk_size)
+
+        result = {}
+        pages = await asyncio.gather(*[fetch_chunk(chunk) for chunk in pyCryptoPayAPI._split_ids(ids, chunk_size)])
+        for items in pages:
+            result.update(pyCryptoPayAPI._index_items(items, id_key))
+        return result
+
+    async def get_invoices_by_ids(self, invoice_ids, chunk_size = MAX_PAGE_SIZE, max_workers = 4):
+        """
+        Non-API method
+        See pyCryptoPayAPI.get_invoices_by_ids for details.
+        """
+        return await self._get_by_ids(
+            lambda ids, count: self.get_invoices(invoice_ids = ids, count = count, return_items = True),
+            "invoice_id", invoice_ids, chunk_size, max_workers)
+
+    async def get_checks_by_ids(self, check_ids, chunk_size = MAX_PAGE_SIZE, max_workers = 4):
+        """
+        Non-API method
+        See pyCryptoPayAPI.get_checks_by_ids for details.
+        """
+        return await self._get_by_ids(
+            lambda ids, count: self.get_checks(check_ids = ids, count = count, return_items = True),
+            "check_id", check_ids, chunk_size, max_workers)
+
+    async def get_transfers_by_ids(self, transfer_ids, chunk_size = MAX_PAGE_SIZE, max_workers = 4):
+        """
+        Non-API method
+        See pyCryptoPayAPI.get_transfers_by_ids for details.
+        """
+        return await self._get_by_ids(
+            lambda ids, count: self.get_transfers(transfer_ids = ids, count = count, return_items = True),
+            "transfer_id", transfer_ids, chunk_size, max_workers)
+
+    def create_invoices_bulk(self, invoices, max_workers = 50):
+        """
+        Non-API method
+        Async generator version of pyCryptoPayAPI.create_invoices_bulk.
+        """
+        return run_bulk_async(lambda params: self.create_invoice(**params), invoices, max_workers)
+
+    def delete_invoices_bulk(self, invoice_ids, max_workers = 50):
+        """
+        Non-API method
+        Async generator version of pyCryptoPayAPI.delete_invoices_bulk.
+        """
+        return run_bulk_async(self.delete_invoice, invoice_ids, max_workers)
+
+    def delete_checks_bulk(self, check_ids, max_workers = 50):
+        """
+        Non-API method
+        Async generator version of pyCryptoPayAPI.delete_checks_bulk.
+        """
+        return run_bulk_async(self.delete_check, check_ids, max_workers)
+
+    async def get_balance(self):
+        """
+        getBalance method
+        See pyCryptoPayAPI.get_balance for details.
+        """
+        method = "getBalance"
+        result = (await self.__request(method)).get("result")
+        if not result:
+            return []
+        elif self.result_as_class:
+            return [Balance(item) for item in result]
+        else:
+            return result
+
+    async def get_exchange_rates(self):
+        """
+        getExchangeRates method
+        See pyCryptoPayAPI.get_exchange_rates for details.
+        """
+        method = "getExchangeRates"
+        result = (await self.__request(method)).get("result")
+        if not result:
+            return []
+        elif self.result_as_class:
+            return [ExchangeRate(item) for item in result]
+        else:
+            return result
+
+    async def get_exchange_rate_table(self, pivots = ("USD", "USDT")):
+        """
+        Non-API method
+        See pyCryptoPayAPI.get_exchange_rate_table for details.
+        """
+        result = (await self.__request("getExchangeRates")).get("result")
+        return ExchangeRateTable(result or [], pivots = pivots)
+
+    async def get_currencies(self):
+        """
+        getCurrencies method
+        See pyCryptoPayAPI.get_currencies for details.
+        """
+        method = "getCurrencies"
+        result = (await self.__request(method)).get("result")
+        if not result:
+            return []
+        elif self.result_as_class:
+            return [Currency(item) for item in result]
+        else:
+            return result
+
+    async def create_check(
+            self, asset, amount, pin_to_user_id = None, pin_to_username = None
+    ):
+        """
+        createCheck method
+        See pyCryptoPayAPI.create_check for details.
+        """
+        method = "createCheck"
+        params = {
+            "asset": asset,
+            "amount": amount,
+        }
+        if pin_to_user_id:
+            params["pin_to_user_id"] = pin_to_user_id
+        if pin_to_username:
+            params["pin_to_username"] = pin_to_username
+        result = (await self.__request(method, **params)).get("result")
+        return Check(result) if self.result_as_class else result
+
+    async def delete_check(self, check_id):
+        """
+        deleteCheck method
+        See pyCryptoPayAPI.delete_check for details.
+        """
+        method = "deleteCheck"
+        params = {
+            "check_id": check_id
+        }
+        return (await self.__request(method, **params)).get("result")
+
+    async def get_stats(self, start_at = None, end_at = None):
+        """
+        getStats method
+        See pyCryptoPayAPI.get_stats for details.
+        """
+        method = "getStats"
+        params = {}
+        if start_at:
+            params["start_at"] = start_at if isinstance(start_at, str) else start_at.isoformat()
+        if end_at:
+            params["end_at"] = end_at if isinstance(end_at, str) else end_at.isoformat()
+        result = (await self.__request(method, **params)).get("result")
+        return AppStats(result) if self.result_as_class else result
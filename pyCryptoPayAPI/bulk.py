@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def run_bulk(func, items, max_workers):
+    """
+    Call func(item) for many items in parallel threads.
+    Keeps a bounded number of submitted calls, so items may be a lazy iterable of any length.
+
+    :param func: Callable taking one item
+    :param items: Iterable of items
+    :param max_workers: Max number of parallel calls
+    :return: Generator of (item, result, exception) tuples in order of completion. Exception is None on success, otherwise it is yielded, not raised.
+    """
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            # Any failure belongs to its item, the other items go on
+            return item, None, e
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(call, item))
+        while pending:
+            done, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+async def run_bulk_async(func, items, max_workers):
+    """
+    Async version of run_bulk(): func(item) returns coroutine, at most max_workers of them run at once.
+
+    :return: Async generator of (item, result, exception) tuples in order of completion.
+    """
+    async def call(item):
+        try:
+            return item, await func(item), None
+        except Exception as e:
+            # Any failure belongs to its item, the other items go on
+            return item, None, e
+
+    pending = set()
+    try:
+        for item in items:
+            if len(pending) >= max_workers:
+                done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(call(item)))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import threading
+import time
+
+# Read-only API methods with slowly changing results and their default TTL in seconds
+DEFAULT_CACHE_TTL = {
+    "getExchangeRates": 60,
+    "getCurrencies": 3600,
+}
+
+
+class TTLCache:
+    """
+    In-memory cache for results of read-only API methods.
+    Values are kept as JSON, so each caller gets its own copy which may be changed freely.
+    Pass an instance to pyCryptoPayAPI(cache=...) or AsyncCryptoPayAPI(cache=...) to enable caching.
+    """
+
+    def __init__(self, ttl = None, stale_ttl = 0, background_refresh = True):
+        """
+        Create the TTLCache instance.
+
+        :param ttl: (Optional) Dict of API method name -> TTL in seconds. Only listed methods are cached. Defaults to DEFAULT_CACHE_TTL.
+        :param stale_ttl: (Optional) Seconds an expired value is still returned while it is refreshed (stale-while-revalidate). Default is 0 (disabled).
+        :param background_refresh: (Optional) Refresh stale values in background thread. If False, stale values are refreshed synchronously. Default is True.
+        """
+        self.ttl = dict(DEFAULT_CACHE_TTL if ttl is None else ttl)
+        self.stale_ttl = stale_ttl
+        self.background_refresh = background_refresh
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refresh_errors = 0
+        self._data = {}
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def is_cached(self, method):
+        """
+        Check if results of API method are cached.
+        """
+        return method in self.ttl
+
+    @staticmethod
+    def make_key(method, params):
+        return method, tuple(sorted(params.items())) if params else ()
+
+    def _lookup(self, key):
+        # Called under lock. Returns (True if found, JSON of value, True if background refresh has to be started)
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            now = time.monotonic()
+            if now < expires_at:
+                self.hits += 1
+                return True, value, False
+            if now < expires_at + self.stale_ttl and self.background_refresh:
+                self.stale_hits += 1
+                refresh = key not in self._refreshing
+                self._refreshing.add(key)
+                return True, value, refresh
+        self.misses += 1
+        return False, None, False
+
+    def get_or_load(self, method, params, loader):
+        """
+        Return cached value for method and params, calling loader() on miss.
+
+        :param method: API method name
+        :param params: Dict of API method params
+        :param loader: Callable returning fresh JSON-serializable value. Exceptions are not cached.
+        """
+        key = self.make_key(method, params)
+        with self._lock:
+            found, value, refresh = self._lookup(key)
+        if refresh:
+            threading.Thread(target = self._refresh, args = (key, method, loader), daemon = True).start()
+        if found:
+            # Decoded outside of the lock, each caller gets its own copy
+            return json.loads(value)
+        return self._store(key, method, loader())
+
+    async def get_or_load_async(self, method, params, loader):
+        """
+        Async version of get_or_load(): loader() returns coroutine. Stale values are refreshed in a background task.
+        """
+        key = self.make_key(method, params)
+        with self._lock:
+            found, value, refresh = self._lookup(key)
+        if refresh:
+            task = asyncio.ensure_future(self._refresh_async(key, method, loader))
+            # Keep reference until done, the event loop holds only weak ones
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if found:
+            # Decoded outside of the lock, each caller gets its own copy
+            return json.loads(value)
+        return self._store(key, method, await loader())
+
+    def _store(self, key, method, value):
+        encoded = json.dumps(value)
+        with self._lock:
+            self._data[key] = (encoded, time.monotonic() + self.ttl[method])
+        return value
+
+    def _refresh(self, key, method, loader):
+        try:
+            self._store(key, method, loader())
+        except Exception:
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _refresh_async(self, key, method, loader):
+        try:
+            self._store(key, method, await loader())
+        except Exception:
+            with self._lock:
+                self.refresh_errors += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, method = None):
+        """
+        Drop cached values.
+
+        :param method: (Optional) API method name to drop values for. Drops everything if not set.
+        """
+        with self._lock:
+            if method is None:
+                self._data.clear()
+            else:
+                for key in [key for key in self._data if key[0] == method]:
+                    del self._data[key]
+
+    def stats(self):
+        """
+        Return dict of cache counters.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "refresh_errors": self.refresh_errors,
+                "size": len(self._data),
+            }
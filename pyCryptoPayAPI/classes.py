@@ -1,8 +1,74 @@
 from abc import ABC
+from datetime import datetime
+from decimal import Decimal
+
+
+def parse_decimal(value):
+    """Parse API amount (string or number) to Decimal."""
+    return Decimal(str(value))
+
+
+def parse_datetime(value):
+    """Parse API date in ISO 8601 format to timezone-aware datetime."""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+class TypedField:
+    """
+    Read-only typed view of a raw field: parsed on first access and memoized.
+    Returns None if the raw field is None. Re-parsed if the raw field is changed.
+    """
+    def __init__(self, field, parser):
+        self.field = field
+        self.parser = parser
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        raw = getattr(instance, self.field)
+        try:
+            parsed = instance._parsed
+        except AttributeError:
+            parsed = instance._parsed = {}
+        entry = parsed.get(self.name)
+        if entry is not None and entry[0] is raw:
+            return entry[1]
+        value = None if raw is None else self.parser(raw)
+        parsed[self.name] = (raw, value)
+        return value
+
+
+def DecimalField(field):
+    return TypedField(field, parse_decimal)
+
+
+def DateTimeField(field):
+    return TypedField(field, parse_datetime)
 
 
 class CrypoPayBase(ABC):
-    """Base class for CryptoPay API classes."""
+    """
+    Base class for CryptoPay API classes.
+    Declared fields are kept in __slots__, fields unknown to the class go to __dict__,
+    which is only allocated when such a field is met. Declared fields missing in data are None.
+    So __dict__ and vars() hold only unknown fields: use to_dict() to get all fields.
+    """
+    __slots__ = ("__dict__", "_parsed")
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            fields.extend(slot for slot in klass.__dict__.get("__slots__", ()) if not slot.startswith("_"))
+        cls._fields = tuple(fields)
+
     def __init__(self, data):
         self.deserialize(data)
 
@@ -10,143 +76,203 @@ class CrypoPayBase(ABC):
         """Deserialize the data into the class attributes."""
         for key, value in data.items():
             setattr(self, key, value)
-            # if hasattr( self, key):
-                # if isinstance(getattr(self, key), list):
-                #     # If the attribute is a list, append the value
-                #     getattr(self, key).append(value)
-                # else:
-                #     # Otherwise, set the attribute directly
-                #     setattr(self, key, value)
+
+    def __getattr__(self, name):
+        # Called only if the attribute is not set: unset declared fields are None
+        if name in self.__class__._fields:
+            return None
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+
+    def to_dict(self):
+        """Return the class attributes as a dict (declared fields first, then unknown ones)."""
+        result = {key: getattr(self, key) for key in self._fields}
+        result.update(self.__dict__)
+        return result
 
     def __repr__(self):
         """Return a string representation of the class."""
         class_name = self.__class__.__name__
-        attributes = ', '.join(f"{key}={value}" for key, value in self.__dict__.items())
+        attributes = ', '.join(f"{key}={value}" for key, value in self.to_dict().items())
         return f"{class_name}({attributes})"
 
 
 class Me(CrypoPayBase):
     """Class representing the current user."""
-    def __init__(self, data):
-        super().__init__(data)
+    __slots__ = ()
 
 
 class Invoice(CrypoPayBase):
     """Class representing a single invoice."""
-    def __init__(self, data):
-        self.invoice_id = None          # Unique ID for this invoice.
-        self.hash = None                # Hash of the invoice.
-        self.currency_type = None       # Type of the price, can be “crypto” or “fiat”.
-        self.asset = None               # Cryptocurrency code if currency_type is "crypto".
-        self.fiat = None                # Fiat currency code if currency_type is "fiat".
-        self.amount = None              # Amount of the invoice.
-        self.paid_asset = None          # Cryptocurrency alphabetic code for paid invoice.
-        self.paid_amount = None         # Amount of the paid invoice.
-        self.paid_fiat_rate = None      # Rate of the paid asset valued in fiat currency.
-        self.accepted_assets = None     # List of assets which can be used to pay the invoice.
-        self.fee_asset = None           # Asset of service fees charged when the invoice was paid.
-        self.fee_amount = None          # Amount of service fees charged when the invoice was paid.
-        self.fee_in_usd = None          # Amount in USD of service fees charged when the invoice was paid.
-        self.pay_url = None             # Deprecated URL for paying the invoice.
-        self.bot_invoice_url = None     # URL to pay the invoice via bot.
-        self.mini_app_invoice_url = None# URL to pay the invoice via Mini App.
-        self.web_app_invoice_url = None # URL to pay the invoice via Web App.
-        self.description = None         # Description for this invoice.
-        self.status = None              # Status of the transfer, can be “active”, “paid” or “expired”.
-        self.swap_to = None             # The asset that will be attempted to be swapped into after payment.
-        self.is_swapped = None          # Indicates whether the swap was successful.
-        self.swapped_uid = None         # Unique identifier of the swap if is_swapped is true.
-        self.swapped_to = None          # Asset into which the swap was made if is_swapped is true.
-        self.swapped_rate = None        # Exchange rate at which the swap was executed if is_swapped is true.
-        self.swapped_output = None      # Amount received as a result of the swap if is_swapped is true.
-        self.swapped_usd_amount = None  # Resulting swap
-        self.swapped_usd_rate = None    # USD exchange rate of the currency from swapped_to if is_swapped is true.
-        self.created_at = None          # Date the invoice was created in ISO 8601 format.
-        self.paid_usd_rate = None       # Price of the asset in USD if status is “paid”.
-        self.usd_rate = None            # Deprecated price of the asset in USD.
-        self.allow_comments = None      # True, if the user can add comment to the payment.
-        self.allow_anonymous = None     # True, if the user can pay the invoice anonymously.
-        self.expiration_date = None     # Date the invoice expires in ISO 8601 format.
-        self.paid_at = None             # Date the invoice was paid in ISO 8601 format.
-        self.paid_anonymously = None    # True, if the invoice was paid anonymously.
-        self.comment = None             # Comment to the payment from the user.
-        self.hidden_message = None      # Text of the hidden message for this invoice.
-        self.payload = None             # Previously provided data for this invoice.
-        self.paid_btn_name = None       # Label of the button, can be “viewItem”, “openChannel”, “openBot” or “callback”.
-        self.paid_btn_url = None        # URL opened using the button.
-        super().__init__(data)
+    __slots__ = (
+        "invoice_id",           # Unique ID for this invoice.
+        "hash",                 # Hash of the invoice.
+        "currency_type",        # Type of the price, can be “crypto” or “fiat”.
+        "asset",                # Cryptocurrency code if currency_type is "crypto".
+        "fiat",                 # Fiat currency code if currency_type is "fiat".
+        "amount",               # Amount of the invoice.
+        "paid_asset",           # Cryptocurrency alphabetic code for paid invoice.
+        "paid_amount",          # Amount of the paid invoice.
+        "paid_fiat_rate",       # Rate of the paid asset valued in fiat currency.
+        "accepted_assets",      # List of assets which can be used to pay the invoice.
+        "fee_asset",            # Asset of service fees charged when the invoice was paid.
+        "fee_amount",           # Amount of service fees charged when the invoice was paid.
+        "fee_in_usd",           # Amount in USD of service fees charged when the invoice was paid.
+        "pay_url",              # Deprecated URL for paying the invoice.
+        "bot_invoice_url",      # URL to pay the invoice via bot.
+        "mini_app_invoice_url", # URL to pay the invoice via Mini App.
+        "web_app_invoice_url",  # URL to pay the invoice via Web App.
+        "description",          # Description for this invoice.
+        "status",               # Status of the transfer, can be “active”, “paid” or “expired”.
+        "swap_to",              # The asset that will be attempted to be swapped into after payment.
+        "is_swapped",           # Indicates whether the swap was successful.
+        "swapped_uid",          # Unique identifier of the swap if is_swapped is true.
+        "swapped_to",           # Asset into which the swap was made if is_swapped is true.
+        "swapped_rate",         # Exchange rate at which the swap was executed if is_swapped is true.
+        "swapped_output",       # Amount received as a result of the swap if is_swapped is true.
+        "swapped_usd_amount",   # Resulting swap
+        "swapped_usd_rate",     # USD exchange rate of the currency from swapped_to if is_swapped is true.
+        "created_at",           # Date the invoice was created in ISO 8601 format.
+        "paid_usd_rate",        # Price of the asset in USD if status is “paid”.
+        "usd_rate",             # Deprecated price of the asset in USD.
+        "allow_comments",       # True, if the user can add comment to the payment.
+        "allow_anonymous",      # True, if the user can pay the invoice anonymously.
+        "expiration_date",      # Date the invoice expires in ISO 8601 format.
+        "paid_at",              # Date the invoice was paid in ISO 8601 format.
+        "paid_anonymously",     # True, if the invoice was paid anonymously.
+        "comment",              # Comment to the payment from the user.
+        "hidden_message",       # Text of the hidden message for this invoice.
+        "payload",              # Previously provided data for this invoice.
+        "paid_btn_name",        # Label of the button, can be “viewItem”, “openChannel”, “openBot” or “callback”.
+        "paid_btn_url",         # URL opened using the button.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    amount_decimal = DecimalField("amount")
+    paid_amount_decimal = DecimalField("paid_amount")
+    paid_fiat_rate_decimal = DecimalField("paid_fiat_rate")
+    fee_amount_decimal = DecimalField("fee_amount")
+    fee_in_usd_decimal = DecimalField("fee_in_usd")
+    swapped_rate_decimal = DecimalField("swapped_rate")
+    swapped_output_decimal = DecimalField("swapped_output")
+    swapped_usd_amount_decimal = DecimalField("swapped_usd_amount")
+    swapped_usd_rate_decimal = DecimalField("swapped_usd_rate")
+    paid_usd_rate_decimal = DecimalField("paid_usd_rate")
+    usd_rate_decimal = DecimalField("usd_rate")
+    created_at_datetime = DateTimeField("created_at")
+    expiration_date_datetime = DateTimeField("expiration_date")
+    paid_at_datetime = DateTimeField("paid_at")
 
 
 class Transfer(CrypoPayBase):
     """Class representing a single transfer."""
-    def __init__(self, data):
-        self.transfer_id = None       # Unique ID for this transfer.
-        self.spend_id = None          # Unique UTF-8 string.
-        self.user_id = None           # Telegram user ID the transfer was sent to.
-        self.asset = None             # Cryptocurrency alphabetic code.
-        self.amount = None            # Amount of the transfer in float.
-        self.status = None            # Status of the transfer, can only be “completed”.
-        self.completed_at = None      # Date the transfer was completed in ISO 8601 format.
-        self.comment = None           # Optional comment for this transfer.
-        super().__init__(data)
+    __slots__ = (
+        "transfer_id",  # Unique ID for this transfer.
+        "spend_id",     # Unique UTF-8 string.
+        "user_id",      # Telegram user ID the transfer was sent to.
+        "asset",        # Cryptocurrency alphabetic code.
+        "amount",       # Amount of the transfer in float.
+        "status",       # Status of the transfer, can only be “completed”.
+        "completed_at", # Date the transfer was completed in ISO 8601 format.
+        "comment",      # Optional comment for this transfer.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    amount_decimal = DecimalField("amount")
+    completed_at_datetime = DateTimeField("completed_at")
 
 
 class Check(CrypoPayBase):
     """Class representing a single check."""
-    def __init__(self, data):
-        self.check_id = None          # Unique ID for this check.
-        self.hash = None              # Hash of the check.
-        self.asset = None             # Cryptocurrency alphabetic code.
-        self.amount = None            # Amount of the check in float.
-        self.bot_check_url = None     # URL to activate the check.
-        self.status = None            # Status of the check, can be “active” or “activated”.
-        self.created_at = None        # Date the check was created in ISO 8601 format.
-        self.activated_at = None      # Date the check was activated in ISO 8601 format.
-        super().__init__(data)
+    __slots__ = (
+        "check_id",      # Unique ID for this check.
+        "hash",          # Hash of the check.
+        "asset",         # Cryptocurrency alphabetic code.
+        "amount",        # Amount of the check in float.
+        "bot_check_url", # URL to activate the check.
+        "status",        # Status of the check, can be “active” or “activated”.
+        "created_at",    # Date the check was created in ISO 8601 format.
+        "activated_at",  # Date the check was activated in ISO 8601 format.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    amount_decimal = DecimalField("amount")
+    created_at_datetime = DateTimeField("created_at")
+    activated_at_datetime = DateTimeField("activated_at")
 
 
 class Balance(CrypoPayBase):
     """Class representing a single balance."""
-    def __init__(self, data):
-        self.currency_code = None # Cryptocurrency alphabetic code. Currently, can be “USDT”, “TON”, “BTC”, “ETH”, “LTC”, “BNB”, “TRX” and “USDC” (and “JET” for testnet).
-        self.available = None     # Total available amount in float.
-        self.onhold = None        # Unavailable amount currently is on hold in float.
-        super().__init__(data)
+    __slots__ = (
+        "currency_code", # Cryptocurrency alphabetic code. Currently, can be “USDT”, “TON”, “BTC”, “ETH”, “LTC”, “BNB”, “TRX” and “USDC” (and “JET” for testnet).
+        "available",     # Total available amount in float.
+        "onhold",        # Unavailable amount currently is on hold in float.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    available_decimal = DecimalField("available")
+    onhold_decimal = DecimalField("onhold")
 
 
 class ExchangeRate(CrypoPayBase):
     """Class representing a single exchange rate."""
-    def __init__(self, data):
-        self.is_valid = None      # True, if the received rate is up-to-date.
-        self.is_crypto = None     # True, if the source is the cryptocurrency.
-        self.is_fiat = None       # True, if the source is the fiat currency.
-        self.source = None        # Cryptocurrency alphabetic code.
-        self.target = None        # Fiat currency code.
-        self.rate = None          # The current rate of the source asset valued in the target currency.
-        super().__init__(data)
+    __slots__ = (
+        "is_valid",  # True, if the received rate is up-to-date.
+        "is_crypto", # True, if the source is the cryptocurrency.
+        "is_fiat",   # True, if the source is the fiat currency.
+        "source",    # Cryptocurrency alphabetic code.
+        "target",    # Fiat currency code.
+        "rate",      # The current rate of the source asset valued in the target currency.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    rate_decimal = DecimalField("rate")
 
 
 class AppStats(CrypoPayBase):
     """Class representing application statistics."""
-    def __init__(self, data):
-        self.volume = None                # Total volume of paid invoices in USD.
-        self.conversion = None            # Conversion of all created invoices.
-        self.unique_users_count = None    # The unique number of users who have paid the invoice.
-        self.created_invoice_count = None # Total created invoice count.
-        self.paid_invoice_count = None    # Total paid invoice count.
-        self.start_at = None              # The date on which the statistics calculation was started in ISO 8601 format.
-        self.end_at = None                # The date on which the statistics calculation was ended in ISO 8601 format.
-        super().__init__(data)
+    __slots__ = (
+        "volume",                # Total volume of paid invoices in USD.
+        "conversion",            # Conversion of all created invoices.
+        "unique_users_count",    # The unique number of users who have paid the invoice.
+        "created_invoice_count", # Total created invoice count.
+        "paid_invoice_count",    # Total paid invoice count.
+        "start_at",              # The date on which the statistics calculation was started in ISO 8601 format.
+        "end_at",                # The date on which the statistics calculation was ended in ISO 8601 format.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    volume_decimal = DecimalField("volume")
+    conversion_decimal = DecimalField("conversion")
+    start_at_datetime = DateTimeField("start_at")
+    end_at_datetime = DateTimeField("end_at")
 
 
 class Currency(CrypoPayBase):
     """Class representing a single currency (not officially declared in API)."""
-    def __init__(self, data):
-        self.is_blockchain = None    # True, if the currency is a blockchain asset.
-        self.is_stablecoin = None    # True, if the currency is a stablecoin.
-        self.is_fiat = None          # True, if the currency is a fiat currency.
-        self.name = None             # Name of the currency.
-        self.code = None             # Code of the currency.
-        self.url = None              # URL of the currency's website.
-        self.decimals = None         # Number of decimals for the currency.
-        super().__init__(data)
+    __slots__ = (
+        "is_blockchain", # True, if the currency is a blockchain asset.
+        "is_stablecoin", # True, if the currency is a stablecoin.
+        "is_fiat",       # True, if the currency is a fiat currency.
+        "name",          # Name of the currency.
+        "code",          # Code of the currency.
+        "url",           # URL of the currency's website.
+        "decimals",      # Number of decimals for the currency.
+    )
+
+
+class Update(CrypoPayBase):
+    """Class representing a webhook update."""
+    __slots__ = (
+        "update_id",    # Non-unique update ID.
+        "update_type",  # Webhook update type. Supported update types: “invoice_paid”.
+        "request_date", # Date the request was sent in ISO 8601 format.
+        "payload",      # Payload of the update: Invoice for “invoice_paid”.
+    )
+
+    # Typed views of raw fields, parsed on first access
+    request_date_datetime = DateTimeField("request_date")
+
+    def deserialize(self, data):
+        super().deserialize(data)
+        if self.update_type == "invoice_paid" and isinstance(self.payload, dict):
+            self.payload = Invoice(self.payload)
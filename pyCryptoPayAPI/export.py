@@ -0,0 +1,235 @@
+import csv
+import json
+import os
+from .api import MAX_PAGE_SIZE
+from .classes import Invoice, Check, Transfer
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# entity -> (fetch method, id field, class)
+_ENTITIES = {
+    "invoices": ("get_invoices", "invoice_id", Invoice),
+    "checks": ("get_checks", "check_id", Check),
+    "transfers": ("get_transfers", "transfer_id", Transfer),
+}
+
+_INT_FIELDS = ("invoice_id", "check_id", "transfer_id", "user_id")
+_BOOL_FIELDS = ("allow_comments", "allow_anonymous", "paid_anonymously", "is_swapped")
+
+# Items already exported are skipped by ID, so resume may start a bit earlier to not miss items shifted by deletes
+_RESUME_OVERLAP = 100
+
+
+def export_schema(entity):
+    """
+    Return fixed export schema of entity as list of (field, type) tuples, type is "int", "bool" or "string".
+    Fields are the declared fields of the corresponding class (Invoice, Check, Transfer).
+
+    :param entity: "invoices", "checks" or "transfers"
+    """
+    if entity not in _ENTITIES:
+        raise ValueError("Unknown entity: {}".format(entity))
+    return [(field, "int" if field in _INT_FIELDS else "bool" if field in _BOOL_FIELDS else "string")
+            for field in _ENTITIES[entity][2]._fields]
+
+
+def _value(value, field_type):
+    if value is None:
+        return None
+    if field_type == "int":
+        return int(value)
+    if field_type == "bool":
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+class _CsvWriter:
+    def __init__(self, path, schema, append):
+        self.file = open(path, "a" if append else "w", newline = "", encoding = "utf-8")
+        self.fields = [field for field, _ in schema]
+        self.writer = csv.writer(self.file)
+        if not append:
+            self.writer.writerow(self.fields)
+
+    @staticmethod
+    def truncate(path, position):
+        # Drop rows written after the last saved state
+        with open(path, "r+b") as output:
+            output.truncate(position)
+
+    def write(self, rows):
+        for row in rows:
+            self.writer.writerow(["" if row[field] is None else row[field] for field in self.fields])
+
+    def checkpoint(self, force):
+        # Returns position to resume from
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class _JsonlWriter(_CsvWriter):
+    def __init__(self, path, schema, append):
+        self.file = open(path, "a" if append else "w", encoding = "utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii = False) + "\n")
+
+
+class _ParquetWriter:
+    # Parquet files can not be appended, so output is a directory of part files and position is number of complete parts
+    PART_ROWS = 100000
+
+    def __init__(self, path, schema, append):
+        if pyarrow is None:
+            raise ImportError("Parquet export requires pyarrow. Install it with: pip install pyCryptoPayAPI[parquet]")
+        types = {"int": pyarrow.int64(), "bool": pyarrow.bool_(), "string": pyarrow.string()}
+        self.schema = pyarrow.schema([(field, types[field_type]) for field, field_type in schema])
+        self.path = path
+        os.makedirs(path, exist_ok = True)
+        if not append:
+            self.truncate(path, 0)
+        self.parts = len(self._part_names(path))
+        self.writer = None
+        self.part_rows = 0
+
+    @staticmethod
+    def _part_names(path):
+        return sorted(name for name in os.listdir(path) if name.startswith("part-") and name.endswith(".parquet"))
+
+    @classmethod
+    def truncate(cls, path, position):
+        for name in cls._part_names(path)[position:]:
+            os.remove(os.path.join(path, name))
+
+    def write(self, rows):
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(os.path.join(self.path, "part-{:05d}.parquet".format(self.parts)), self.schema)
+        self.writer.write_table(pyarrow.Table.from_pylist(rows, schema = self.schema))
+        self.part_rows += len(rows)
+
+    def checkpoint(self, force):
+        if self.writer is not None and (force or self.part_rows >= self.PART_ROWS):
+            self.writer.close()
+            self.writer = None
+            self.part_rows = 0
+            self.parts += 1
+        return self.parts
+
+    def close(self):
+        self.checkpoint(True)
+
+
+_WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+class Exporter:
+    """
+    Streaming export of invoices, checks and transfers to CSV, JSON lines or Parquet (requires pyarrow).
+    Items are written page by page, so memory use does not depend on the number of rows.
+    Progress is saved next to the output, an interrupted export continues from the last saved page.
+    """
+
+    def __init__(self, client, page_size = MAX_PAGE_SIZE):
+        """
+        Create the Exporter instance.
+
+        :param client: pyCryptoPayAPI instance.
+        :param page_size: (Optional) Number of items requested per call, 1-1000. Default is 1000.
+        """
+        self.client = client
+        self.page_size = page_size
+
+    @staticmethod
+    def _format(path, file_format):
+        if file_format is None:
+            extension = os.path.splitext(path)[1].lower()
+            file_format = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".parquet": "parquet"}.get(extension)
+        if file_format not in _WRITERS:
+            raise ValueError("Unknown export format: {}".format(file_format))
+        return file_format
+
+    @staticmethod
+    def _load_state(state_path, entity, file_format, filters):
+        try:
+            with open(state_path, encoding = "utf-8") as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return None
+        if state.get("entity") != entity or state.get("format") != file_format or state.get("filters") != filters:
+            return None
+        return state
+
+    @staticmethod
+    def _save_state(state_path, state):
+        temp_path = state_path + ".tmp"
+        with open(temp_path, "w", encoding = "utf-8") as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, state_path)
+
+    def export(self, entity, path, file_format = None, resume = True, **filters):
+        """
+        Non-API method
+        Export all items of entity to file.
+
+        :param entity: "invoices", "checks" or "transfers"
+        :param path: Output file path. For Parquet it is a directory of part files.
+        :param file_format: (Optional) "csv", "jsonl" or "parquet". Detected by path extension by default.
+        :param resume: (Optional) Continue interrupted export of the same entity, format and filters. Default is True.
+        :param filters: (Optional) Filters of the fetch method, e.g. asset="TON", status="paid".
+        :return: Dict with "rows" (total rows in output) and "resumed".
+        """
+        file_format = self._format(path, file_format)
+        fetch_name, id_key, _ = _ENTITIES[entity]
+        schema = export_schema(entity)
+        types = dict(schema)
+        state_path = path.rstrip("/\\") + ".state"
+        state = self._load_state(state_path, entity, file_format, filters) if resume and os.path.exists(path) else None
+        writer_class = _WRITERS[file_format]
+        if state is not None:
+            writer_class.truncate(path, state["position"])
+        else:
+            state = {"entity": entity, "format": file_format, "filters": filters, "offset": 0, "last_id": None, "rows": 0, "position": 0}
+        resumed = state["rows"] > 0
+        writer = writer_class(path, schema, resumed)
+        fetch = getattr(self.client, fetch_name)
+        try:
+            offset = max(0, state["offset"] - _RESUME_OVERLAP) if resumed else 0
+            while True:
+                items = fetch(offset = offset, count = self.page_size, return_items = True, **filters)
+                offset += len(items)
+                last_page = len(items) < self.page_size
+                rows = []
+                for item in items:
+                    raw = item if isinstance(item, dict) else item.to_dict()
+                    # Items are returned newest first: lower ID means not exported yet
+                    if state["last_id"] is not None and raw[id_key] >= state["last_id"]:
+                        continue
+                    rows.append({field: _value(raw.get(field), types[field]) for field, _ in schema})
+                del items
+                if rows:
+                    writer.write(rows)
+                    state["rows"] += len(rows)
+                    state["last_id"] = rows[-1][id_key]
+                    state["offset"] = offset
+                    position = writer.checkpoint(last_page)
+                    if position != state["position"] or file_format != "parquet":
+                        state["position"] = position
+                        self._save_state(state_path, state)
+                if last_page:
+                    break
+        finally:
+            writer.close()
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return {"rows": state["rows"], "resumed": resumed}
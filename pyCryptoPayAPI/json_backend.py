@@ -0,0 +1,29 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKENDS = {"json": json.loads}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = orjson.loads
+
+# orjson is used if installed: pip install pyCryptoPayAPI[speedups]
+DEFAULT_JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def get_json_loads(backend = None):
+    """
+    Return JSON decode function accepting bytes or str.
+
+    :param backend: (Optional) "json", "orjson" or callable. Defaults to DEFAULT_JSON_BACKEND.
+    """
+    if backend is None:
+        backend = DEFAULT_JSON_BACKEND
+    if callable(backend):
+        return backend
+    if backend not in JSON_BACKENDS:
+        raise ValueError("Unknown or not installed JSON backend: {}".format(backend))
+    return JSON_BACKENDS[backend]
@@ -0,0 +1,318 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from .api import pyCryptoPayException
+from .classes import parse_datetime
+
+_ZERO = Decimal(0)
+
+
+def _field(item, name):
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def _decimal(value):
+    return Decimal(str(value)) if value not in (None, "") else _ZERO
+
+
+class BalanceLedger:
+    """
+    Local copy of app balance (available and onhold per asset) kept up to date by local deltas:
+    transfers and checks made through the ledger and paid invoices passed to invoice_paid().
+    Balance checks become in-memory lookups; the ledger is reconciled with getBalance
+    every reconcile_interval seconds and on drift (server reports insufficient funds,
+    local balance goes negative, unknown check is deleted).
+    """
+
+    def __init__(self, client, reconcile_interval = 300, dedupe_size = 100000):
+        """
+        Create the BalanceLedger instance.
+
+        :param client: pyCryptoPayAPI instance.
+        :param reconcile_interval: (Optional) Seconds between reconciliations with getBalance, None to reconcile only on drift. Default is 300.
+        :param dedupe_size: (Optional) Number of last paid invoice IDs and transfer IDs remembered to not count them twice. Default is 100000.
+        """
+        self.client = client
+        self.reconcile_interval = reconcile_interval
+        self.dedupe_size = dedupe_size
+        self.reconciles = 0
+        self.last_drift = {}
+        self._available = {}
+        self._onhold = {}
+        self._checks = {}
+        self._paid = OrderedDict()
+        self._transfers = OrderedDict()
+        self._synced_at = None
+        self._synced_at_utc = None
+        self._stale = True
+        self._in_flight = 0
+        self._reconciling = False
+        self._reconcile_pending = 0
+        self._condition = threading.Condition()
+
+    # Reconciliation
+
+    def reconcile(self):
+        """
+        Replace local balance by getBalance result. Waits for operations in flight and blocks new ones meanwhile.
+
+        :return: Dict of asset -> (available drift, onhold drift), server minus local, for assets which differed.
+        """
+        with self._condition:
+            # New operations queue behind the pending reconciliation, so it is not starved under load
+            self._reconcile_pending += 1
+            try:
+                while self._reconciling or self._in_flight:
+                    self._condition.wait()
+            finally:
+                self._reconcile_pending -= 1
+            self._reconciling = True
+        try:
+            started_utc = datetime.now(timezone.utc)
+            balances = self.client.get_balance()
+            available = {}
+            onhold = {}
+            for balance in balances:
+                asset = _field(balance, "currency_code")
+                available[asset] = _decimal(_field(balance, "available"))
+                onhold[asset] = _decimal(_field(balance, "onhold"))
+            with self._condition:
+                drift = {}
+                if self._synced_at is not None:
+                    for asset in set(available) | set(self._available):
+                        difference = (available.get(asset, _ZERO) - self._available.get(asset, _ZERO),
+                                      onhold.get(asset, _ZERO) - self._onhold.get(asset, _ZERO))
+                        if difference != (_ZERO, _ZERO):
+                            drift[asset] = difference
+                self._available = available
+                self._onhold = onhold
+                self._synced_at = time.monotonic()
+                self._synced_at_utc = started_utc
+                self._stale = False
+                self.reconciles += 1
+                self.last_drift = drift
+                return drift
+        finally:
+            with self._condition:
+                self._reconciling = False
+                self._condition.notify_all()
+
+    def _ensure_fresh(self):
+        with self._condition:
+            due = self._stale or (self.reconcile_interval is not None and time.monotonic() - self._synced_at >= self.reconcile_interval)
+        if due:
+            self.reconcile()
+
+    def mark_stale(self):
+        """
+        Reconcile before the next balance lookup.
+        """
+        with self._condition:
+            self._stale = True
+
+    # Lookups
+
+    def available(self, asset):
+        """
+        Return available amount of asset (Decimal).
+        """
+        self._ensure_fresh()
+        with self._condition:
+            return self._available.get(asset, _ZERO)
+
+    def onhold(self, asset):
+        """
+        Return amount of asset on hold (Decimal), e.g. in active checks.
+        """
+        self._ensure_fresh()
+        with self._condition:
+            return self._onhold.get(asset, _ZERO)
+
+    def balances(self):
+        """
+        Return dict of asset -> {"available": Decimal, "onhold": Decimal}.
+        """
+        self._ensure_fresh()
+        with self._condition:
+            return {asset: {"available": amount, "onhold": self._onhold.get(asset, _ZERO)} for asset, amount in self._available.items()}
+
+    def has_funds(self, asset, amount):
+        """
+        Check if available balance covers the amount. Reconciles before answering "no",
+        as payments received since the last reconciliation may be unknown.
+        """
+        amount = _decimal(amount)
+        if self.available(asset) >= amount:
+            return True
+        with self._condition:
+            recent = self._synced_at is not None and time.monotonic() - self._synced_at < 1
+        if not recent:
+            self.reconcile()
+        return self.available(asset) >= amount
+
+    def require(self, required):
+        """
+        Raise pyCryptoPayException (-8) if available balance does not cover the amounts.
+
+        :param required: Dict of asset -> amount
+        """
+        short = ["{} {} > {}".format(asset, amount, self.available(asset)) for asset, amount in required.items() if not self.has_funds(asset, amount)]
+        if short:
+            raise pyCryptoPayException(-8, "INSUFFICIENT_BALANCE", "Not enough balance: {}".format(", ".join(short)))
+
+    # Deltas
+
+    def _apply(self, asset, available = _ZERO, onhold = _ZERO):
+        # Called under lock
+        self._available[asset] = self._available.get(asset, _ZERO) + available
+        self._onhold[asset] = self._onhold.get(asset, _ZERO) + onhold
+        if self._available[asset] < 0 or self._onhold[asset] < 0:
+            self._stale = True
+
+    def _call(self, func):
+        # Operations changing balance do not overlap with reconciliation, so their result is counted once
+        with self._condition:
+            while self._reconciling or self._reconcile_pending:
+                self._condition.wait()
+            self._in_flight += 1
+        try:
+            return func()
+        except pyCryptoPayException as pe:
+            if "INSUFFICIENT" in str(pe.name) or "NOT_ENOUGH" in str(pe.name):
+                self.mark_stale()
+            raise
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def transfer(self, user_id, asset, amount, spend_id, **kwargs):
+        """
+        Non-API method
+        Send transfer via client and subtract it from available balance.
+        Takes the same params as pyCryptoPayAPI.transfer.
+        Transfers the client transfer_journal already completed are returned without sending and not subtracted again.
+        """
+        def send():
+            journal = getattr(self.client, "transfer_journal", None)
+            record = journal.get(spend_id) if journal is not None else None
+            result = self.client.transfer(user_id, asset, amount, spend_id, **kwargs)
+            if record is None or record[0] == journal.FAILED:
+                self.transfer_done(result)
+            elif record[0] == journal.PENDING:
+                # Interrupted earlier: the transfer may have been accepted before the last reconciliation
+                self.mark_stale()
+            return result
+        return self._call(send)
+
+    def transfer_done(self, transfer):
+        """
+        Apply transfer made without the ledger (dict or Transfer instance). Each transfer is counted once.
+        """
+        transfer_id = _field(transfer, "transfer_id")
+        with self._condition:
+            if transfer_id is not None:
+                if transfer_id in self._transfers:
+                    return
+                self._transfers[transfer_id] = True
+                if len(self._transfers) > self.dedupe_size:
+                    self._transfers.popitem(last = False)
+            self._apply(_field(transfer, "asset"), available = -_decimal(_field(transfer, "amount")))
+
+    def create_check(self, asset, amount, **kwargs):
+        """
+        Non-API method
+        Create check via client and move its amount from available to onhold.
+        Takes the same params as pyCryptoPayAPI.create_check.
+        """
+        def send():
+            result = self.client.create_check(asset, amount, **kwargs)
+            self.check_created(result)
+            return result
+        return self._call(send)
+
+    def check_created(self, check):
+        """
+        Apply check created without the ledger (dict or Check instance).
+        """
+        asset = _field(check, "asset")
+        amount = _decimal(_field(check, "amount"))
+        with self._condition:
+            self._checks[_field(check, "check_id")] = (asset, amount)
+            self._apply(asset, available = -amount, onhold = amount)
+
+    def delete_check(self, check_id):
+        """
+        Non-API method
+        Delete check via client and return its amount from onhold to available.
+        """
+        def send():
+            result = self.client.delete_check(check_id)
+            self.check_deleted(check_id)
+            return result
+        return self._call(send)
+
+    def check_deleted(self, check_id):
+        """
+        Apply check deleted without the ledger. Checks not created via the ledger cause reconciliation.
+        """
+        with self._condition:
+            check = self._checks.pop(check_id, None)
+            if check is None:
+                self._stale = True
+            else:
+                asset, amount = check
+                self._apply(asset, available = amount, onhold = -amount)
+
+    def check_activated(self, check_id):
+        """
+        Drop onhold amount of the check activated by user.
+        """
+        with self._condition:
+            check = self._checks.pop(check_id, None)
+            if check is None:
+                self._stale = True
+            else:
+                asset, amount = check
+                self._apply(asset, onhold = -amount)
+
+    def invoice_paid(self, invoice):
+        """
+        Add paid invoice (dict, Invoice or Update instance) to available balance, minus fee.
+        May be used as WebhookHandler or PaymentWatcher callback. Each invoice is counted once;
+        invoices paid before the last reconciliation are already in the balance and are skipped.
+        """
+        invoice = _field(invoice, "payload") if _field(invoice, "update_type") is not None else invoice
+        if _field(invoice, "status") != "paid":
+            return
+        invoice_id = _field(invoice, "invoice_id")
+        paid_at = _field(invoice, "paid_at")
+        with self._condition:
+            if invoice_id in self._paid:
+                return
+            self._paid[invoice_id] = True
+            if len(self._paid) > self.dedupe_size:
+                self._paid.popitem(last = False)
+            if paid_at and self._synced_at_utc is not None and parse_datetime(paid_at) <= self._synced_at_utc:
+                return
+            if _field(invoice, "is_swapped"):
+                self._apply(_field(invoice, "swapped_to"), available = _decimal(_field(invoice, "swapped_output")))
+                return
+            self._apply(_field(invoice, "paid_asset"), available = _decimal(_field(invoice, "paid_amount")))
+            fee_amount = _decimal(_field(invoice, "fee_amount"))
+            if fee_amount:
+                self._apply(_field(invoice, "fee_asset") or _field(invoice, "paid_asset"), available = -fee_amount)
+
+    def stats(self):
+        """
+        Return dict of ledger state.
+        """
+        with self._condition:
+            return {
+                "reconciles": self.reconciles,
+                "last_drift": dict(self.last_drift),
+                "stale": self._stale,
+                "checks": len(self._checks),
+            }
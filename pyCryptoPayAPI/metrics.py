@@ -0,0 +1,192 @@
+import threading
+from collections import deque
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def params_size(data):
+    """
+    Non-API method
+    Approximate size of query string of request params in bytes.
+    """
+    return sum(len(str(key)) + len(str(value)) + 2 for key, value in data.items())
+
+
+def notify_before(hooks, method, size):
+    for hook in hooks:
+        before = getattr(hook, "before_request", None)
+        if before is not None:
+            try:
+                before(method, size)
+            except Exception:
+                # Instrumentation must never break API calls
+                pass
+
+
+def notify_after(hooks, method, size, duration, status, error_code):
+    for hook in hooks:
+        after = getattr(hook, "after_request", None)
+        if after is not None:
+            try:
+                after(method, size, duration, status, error_code)
+            except Exception:
+                pass
+
+
+class _MethodStats:
+    __slots__ = ("requests", "errors", "in_flight", "duration_sum", "params_bytes", "durations", "error_codes", "statuses")
+
+    def __init__(self, window):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.duration_sum = 0.0
+        self.params_bytes = 0
+        self.durations = deque(maxlen = window)
+        self.error_codes = {}
+        self.statuses = {}
+
+
+class RequestMetrics:
+    """
+    Request hook collecting per-method counters and rolling latency percentiles.
+    Pass it to the client: pyCryptoPayAPI(..., request_hooks=[metrics]).
+    Export with snapshot(), samples() (name, labels, value for any metrics sink) or prometheus_text().
+
+    Any object with before_request(method, params_size) and/or
+    after_request(method, params_size, duration, status, error_code) methods can be used as a hook.
+    """
+
+    def __init__(self, window = 1000, quantiles = DEFAULT_QUANTILES):
+        """
+        Create the RequestMetrics instance.
+
+        :param window: (Optional) Number of latest requests per method used for percentiles. Default is 1000.
+        :param quantiles: (Optional) Reported quantiles. Default is (0.5, 0.95, 0.99).
+        """
+        self.window = window
+        self.quantiles = tuple(quantiles)
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def _get(self, method):
+        stats = self._methods.get(method)
+        if stats is None:
+            stats = self._methods[method] = _MethodStats(self.window)
+        return stats
+
+    def before_request(self, method, params_size):
+        """
+        Non-API method
+        Called before each HTTP request.
+        """
+        with self._lock:
+            self._get(method).in_flight += 1
+
+    def after_request(self, method, params_size, duration, status, error_code):
+        """
+        Non-API method
+        Called after each HTTP request (every retry attempt is a separate request).
+
+        :param method: API method name
+        :param params_size: Approximate size of request params in bytes
+        :param duration: Request duration in seconds
+        :param status: HTTP status or None if no response was received
+        :param error_code: pyCryptoPayException code or None on success
+        """
+        with self._lock:
+            stats = self._get(method)
+            stats.in_flight -= 1
+            stats.requests += 1
+            stats.duration_sum += duration
+            stats.params_bytes += params_size
+            stats.durations.append(duration)
+            if status is not None:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if error_code is not None:
+                stats.errors += 1
+                stats.error_codes[error_code] = stats.error_codes.get(error_code, 0) + 1
+
+    @staticmethod
+    def _percentiles(durations, quantiles):
+        values = sorted(durations)
+        if not values:
+            return {quantile: None for quantile in quantiles}
+        return {quantile: values[min(len(values) - 1, int(len(values) * quantile))] for quantile in quantiles}
+
+    def snapshot(self):
+        """
+        Return dict of API method -> dict with requests, errors, in_flight, duration_sum, params_bytes,
+        quantiles ({quantile: seconds}), error_codes and statuses.
+        """
+        with self._lock:
+            methods = {method: (stats.requests, stats.errors, stats.in_flight, stats.duration_sum, stats.params_bytes,
+                                list(stats.durations), dict(stats.error_codes), dict(stats.statuses))
+                       for method, stats in self._methods.items()}
+        result = {}
+        for method, (requests, errors, in_flight, duration_sum, params_bytes, durations, error_codes, statuses) in methods.items():
+            result[method] = {
+                "requests": requests,
+                "errors": errors,
+                "in_flight": in_flight,
+                "duration_sum": duration_sum,
+                "params_bytes": params_bytes,
+                "quantiles": self._percentiles(durations, self.quantiles),
+                "error_codes": error_codes,
+                "statuses": statuses,
+            }
+        return result
+
+    def samples(self, prefix = "cryptopay"):
+        """
+        Yield (name, labels, value) tuples of all metrics, e.g. to feed OpenTelemetry or StatsD sink.
+
+        :param prefix: (Optional) Metric name prefix. Default is "cryptopay".
+        """
+        for method, stats in sorted(self.snapshot().items()):
+            labels = {"method": method}
+            yield prefix + "_requests_total", labels, stats["requests"]
+            yield prefix + "_requests_in_flight", labels, stats["in_flight"]
+            yield prefix + "_params_bytes_total", labels, stats["params_bytes"]
+            for code, count in sorted(stats["error_codes"].items(), key = lambda item: str(item[0])):
+                yield prefix + "_errors_total", dict(labels, code = str(code)), count
+            for status, count in sorted(stats["statuses"].items()):
+                yield prefix + "_responses_total", dict(labels, status = str(status)), count
+            for quantile, value in stats["quantiles"].items():
+                if value is not None:
+                    yield prefix + "_request_duration_seconds", dict(labels, quantile = str(quantile)), value
+            yield prefix + "_request_duration_seconds_sum", labels, stats["duration_sum"]
+            yield prefix + "_request_duration_seconds_count", labels, stats["requests"]
+
+    def prometheus_text(self, prefix = "cryptopay"):
+        """
+        Return metrics in Prometheus text exposition format.
+
+        :param prefix: (Optional) Metric name prefix. Default is "cryptopay".
+        """
+        types = {
+            prefix + "_requests_total": "counter",
+            prefix + "_requests_in_flight": "gauge",
+            prefix + "_params_bytes_total": "counter",
+            prefix + "_errors_total": "counter",
+            prefix + "_responses_total": "counter",
+            prefix + "_request_duration_seconds": "summary",
+        }
+        # Samples of one metric family have to be grouped together
+        families = {}
+        for name, labels, value in self.samples(prefix):
+            family = name[:-len("_sum")] if name.endswith("_sum") else name[:-len("_count")] if name.endswith("_count") else name
+            label_text = ",".join('{}="{}"'.format(key, str(item).replace("\\", "\\\\").replace('"', '\\"')) for key, item in labels.items())
+            families.setdefault(family, []).append("{}{{{}}} {}".format(name, label_text, value))
+        lines = []
+        for family, samples in families.items():
+            lines.append("# TYPE {} {}".format(family, types.get(family, "untyped")))
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """
+        Clear all collected metrics.
+        """
+        with self._lock:
+            self._methods = {}
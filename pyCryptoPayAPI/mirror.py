@@ -0,0 +1,212 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from .classes import Invoice, Check, Transfer
+
+
+# entity -> (table, id field, fetch method, by ids method, final statuses, indexed columns, date column, class)
+_ENTITIES = {
+    "invoices": ("invoices", "invoice_id", "iter_invoices", "get_invoices_by_ids", ("paid", "expired"), ("status", "asset", "fiat", "payload", "created_at", "paid_at"), "created_at", Invoice),
+    "checks": ("checks", "check_id", "iter_checks", "get_checks_by_ids", ("activated",), ("status", "asset", "created_at", "activated_at"), "created_at", Check),
+    "transfers": ("transfers", "transfer_id", "iter_transfers", None, None, ("status", "asset", "spend_id", "user_id", "completed_at"), "completed_at", Transfer),
+}
+
+
+def _raw(item):
+    if isinstance(item, dict):
+        return item
+    return {key: value for key, value in item.to_dict().items() if value is not None}
+
+
+def _iso(value):
+    # API dates look like 2024-05-01T10:00:00.000Z, so stored values are compared as strings
+    if value is None or isinstance(value, str):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + "{:03d}Z".format(value.microsecond // 1000)
+
+
+class LocalMirror:
+    """
+    Local SQLite copy of invoices, checks and transfers of the app with incremental sync.
+    The API returns items newest first, so sync fetches pages until it meets an already known ID,
+    and re-checks only items in non-final status (active invoices and checks).
+    """
+
+    def __init__(self, client, path = ":memory:", page_size = 1000):
+        """
+        Create the LocalMirror instance.
+
+        :param client: pyCryptoPayAPI instance used for sync.
+        :param path: (Optional) SQLite database file path. Default is in-memory database.
+        :param page_size: (Optional) Number of items requested per call during sync, 1-1000. Default is 1000.
+        """
+        self.client = client
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread = False)
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS sync_state (entity TEXT PRIMARY KEY, watermark INTEGER, synced_at TEXT)")
+            for table, id_field, _, _, _, columns, _, _ in _ENTITIES.values():
+                self._db.execute("CREATE TABLE IF NOT EXISTS {} (id INTEGER PRIMARY KEY, {}, data TEXT NOT NULL)".format(
+                    table, ", ".join("{} TEXT".format(column) for column in columns)))
+                for column in columns:
+                    self._db.execute("CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})".format(table, column))
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _upsert(self, entity, items):
+        table, id_field, _, _, _, columns, _, _ = _ENTITIES[entity]
+        rows = []
+        for item in items:
+            rows.append([item[id_field]] + [None if item.get(column) is None else str(item[column]) for column in columns] + [json.dumps(item)])
+        if rows:
+            self._db.executemany("INSERT OR REPLACE INTO {} (id, {}, data) VALUES ({})".format(
+                table, ", ".join(columns), ", ".join("?" * (len(columns) + 2))), rows)
+        return len(rows)
+
+    def _watermark(self, entity):
+        row = self._db.execute("SELECT watermark FROM sync_state WHERE entity = ?", (entity,)).fetchone()
+        return row[0] if row else None
+
+    def _sync_entity(self, entity):
+        table, id_field, iter_method, by_ids_method, final_statuses, _, _, _ = _ENTITIES[entity]
+        with self._lock:
+            watermark = self._watermark(entity)
+        # Re-check items which still may change status
+        updated = deleted = 0
+        if by_ids_method and watermark is not None:
+            with self._lock:
+                pending = dict(self._db.execute(
+                    "SELECT id, status FROM {} WHERE status IS NULL OR status NOT IN ({})".format(table, ", ".join("?" * len(final_statuses))),
+                    final_statuses).fetchall())
+            if pending:
+                fresh = {item_id: _raw(item) for item_id, item in getattr(self.client, by_ids_method)(pending).items()}
+                with self._lock, self._db:
+                    updated = self._upsert(entity, [item for item_id, item in fresh.items() if item.get("status") != pending.get(item_id)])
+                    gone = [(item_id,) for item_id in pending if item_id not in fresh]
+                    self._db.executemany("DELETE FROM {} WHERE id = ?".format(table), gone)
+                    deleted = len(gone)
+        # Fetch new items until a known one is met, store them page by page
+        added = 0
+        new_watermark = watermark or 0
+        page = []
+        for item in getattr(self.client, iter_method)(page_size = self.page_size):
+            item = _raw(item)
+            if watermark is not None and item[id_field] <= watermark:
+                break
+            new_watermark = max(new_watermark, item[id_field])
+            page.append(item)
+            if len(page) >= self.page_size:
+                with self._lock, self._db:
+                    added += self._upsert(entity, page)
+                page = []
+        with self._lock, self._db:
+            added += self._upsert(entity, page)
+            self._db.execute("INSERT OR REPLACE INTO sync_state (entity, watermark, synced_at) VALUES (?, ?, ?)",
+                             (entity, new_watermark, _iso(datetime.now(timezone.utc))))
+        return {"new": added, "updated": updated, "deleted": deleted}
+
+    def sync(self, entities = ("invoices", "checks", "transfers")):
+        """
+        Fetch new and changed items from API.
+
+        :param entities: (Optional) What to sync: any of "invoices", "checks", "transfers". Default is all.
+        :return: Dict of entity -> {"new": N, "updated": N, "deleted": N}.
+        """
+        return {entity: self._sync_entity(entity) for entity in entities}
+
+    def last_sync(self, entity = "invoices"):
+        """
+        Return time of the last sync of entity as ISO 8601 string, or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT synced_at FROM sync_state WHERE entity = ?", (entity,)).fetchone()
+        return row[0] if row else None
+
+    def _query(self, entity, date_from, date_to, limit, offset, filters):
+        table, _, _, _, _, _, date_column, cls = _ENTITIES[entity]
+        conditions = []
+        values = []
+        for column, value in filters.items():
+            if value is not None:
+                conditions.append("{} = ?".format(column))
+                values.append(str(value))
+        if date_from is not None:
+            conditions.append("{} >= ?".format(date_column))
+            values.append(_iso(date_from))
+        if date_to is not None:
+            conditions.append("{} < ?".format(date_column))
+            values.append(_iso(date_to))
+        sql = "SELECT data FROM {}{} ORDER BY id DESC".format(table, " WHERE " + " AND ".join(conditions) if conditions else "")
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            values.extend([limit, offset])
+        with self._lock:
+            rows = self._db.execute(sql, values).fetchall()
+        items = [json.loads(row[0]) for row in rows]
+        return [cls(item) for item in items] if self.client.result_as_class else items
+
+    def invoices(self, status = None, asset = None, fiat = None, payload = None, date_from = None, date_to = None, limit = None, offset = 0):
+        """
+        Query stored invoices, newest first.
+
+        :param status: (String) Optional. Invoice status.
+        :param asset: (String) Optional. Cryptocurrency code.
+        :param fiat: (String) Optional. Fiat currency code.
+        :param payload: (String) Optional. Exact payload.
+        :param date_from: (DateTime/String) Optional. Created at or after.
+        :param date_to: (DateTime/String) Optional. Created before.
+        :param limit: (Number) Optional. Max number of items.
+        :param offset: (Number) Optional. Number of items to skip if limit is set.
+        :return: List of invoices (dicts or Invoice instances, same as client).
+        """
+        return self._query("invoices", date_from, date_to, limit, offset, {"status": status, "asset": asset, "fiat": fiat, "payload": payload})
+
+    def checks(self, status = None, asset = None, date_from = None, date_to = None, limit = None, offset = 0):
+        """
+        Query stored checks, newest first. Dates are compared with created_at.
+
+        :return: List of checks (dicts or Check instances, same as client).
+        """
+        return self._query("checks", date_from, date_to, limit, offset, {"status": status, "asset": asset})
+
+    def transfers(self, asset = None, spend_id = None, user_id = None, date_from = None, date_to = None, limit = None, offset = 0):
+        """
+        Query stored transfers, newest first. Dates are compared with completed_at.
+
+        :return: List of transfers (dicts or Transfer instances, same as client).
+        """
+        return self._query("transfers", date_from, date_to, limit, offset, {"asset": asset, "spend_id": spend_id, "user_id": user_id})
+
+    def get(self, entity, item_id):
+        """
+        Get stored item by ID.
+
+        :param entity: "invoices", "checks" or "transfers".
+        :param item_id: Item ID.
+        :return: Item (dict or class instance, same as client) or None.
+        """
+        table, _, _, _, _, _, _, cls = _ENTITIES[entity]
+        with self._lock:
+            row = self._db.execute("SELECT data FROM {} WHERE id = ?".format(table), (item_id,)).fetchone()
+        if row is None:
+            return None
+        item = json.loads(row[0])
+        return cls(item) if self.client.result_as_class else item
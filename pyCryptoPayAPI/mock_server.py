@@ -0,0 +1,324 @@
+import json
+import random
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def _format_date(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + "{:03d}Z".format(value.microsecond // 1000)
+
+
+def _now():
+    return _format_date(datetime.now(timezone.utc))
+
+
+class MockCryptoPayServer:
+    """
+    Local stand-in of Crypto Pay API for tests and benchmarks.
+    Keeps invoices, checks, transfers and balances in memory. Supports latency and error injection.
+    Point a client to it with api_url=server.url.
+    """
+
+    def __init__(self, host = "127.0.0.1", port = 0, latency = 0, error_rate = 0, error_status = 500, method_errors = None, api_token = None):
+        """
+        Create the MockCryptoPayServer instance.
+
+        :param host: (Optional) Host to listen on. Default is 127.0.0.1.
+        :param port: (Optional) Port to listen on. Default is 0 (any free port).
+        :param latency: (Optional) Delay of each response in seconds. Default is 0.
+        :param error_rate: (Optional) Share of requests (0-1) answered with error_status. Default is 0.
+        :param error_status: (Optional) HTTP status of injected errors (e.g. 500, 502, 429). Default is 500.
+        :param method_errors: (Optional) Dict of API method -> (code, name) API error returned for every call.
+        :param api_token: (Optional) Accept only this token. Default is to accept any.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.method_errors = dict(method_errors or {})
+        self.api_token = api_token
+        self.requests = 0
+        self.balances = {"USDT": "1000000", "TON": "1000000", "BTC": "100", "ETH": "1000"}
+        self.onhold = {asset: "0" for asset in self.balances}
+        self.rates = {"USDT": "1", "TON": "5.2", "BTC": "60000", "ETH": "3000"}
+        self.invoices = {}
+        self.checks = {}
+        self.transfers = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        API URL to pass as api_url to the client.
+        """
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}/api/".format(host, port)
+
+    def start(self):
+        """
+        Start serving in background thread.
+        """
+        self._thread = threading.Thread(target = self._server.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, do not let Nagle delay the body
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._handle(self)
+
+            do_POST = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _handle(self, request):
+        url = urlparse(request.path)
+        method = url.path.rsplit("/", 1)[-1]
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(request.headers.get("Content-Length") or 0)
+        if length:
+            request.rfile.read(length)
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            body = b"<html>Injected error</html>"
+            status = self.error_status
+            content_type = "text/html"
+        else:
+            status = 200
+            content_type = "application/json"
+            if self.api_token is not None and request.headers.get("Crypto-Pay-API-Token") != self.api_token:
+                response = {"ok": False, "error": {"code": 401, "name": "UNAUTHORIZED"}}
+            elif method in self.method_errors:
+                code, name = self.method_errors[method]
+                response = {"ok": False, "error": {"code": code, "name": name}}
+            else:
+                handler = getattr(self, "_api_" + method, None)
+                if handler is None:
+                    response = {"ok": False, "error": {"code": 405, "name": "METHOD_NOT_FOUND"}}
+                else:
+                    try:
+                        with self._lock:
+                            response = {"ok": True, "result": handler(params)}
+                    except _ApiError as e:
+                        response = {"ok": False, "error": {"code": e.code, "name": e.name}}
+            body = json.dumps(response).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    # API methods. Called under lock.
+
+    @staticmethod
+    def _page(store, params, id_key, filters):
+        # Items are stored in creation order, API returns newest first
+        items = reversed(list(store.values()))
+        ids = params.get(id_key + "s")
+        if ids:
+            wanted = set(int(item_id) for item_id in ids.split(","))
+            items = [item for item in items if item[id_key] in wanted]
+        for name in filters:
+            if params.get(name):
+                items = [item for item in items if str(item.get(name)) == params[name]]
+        offset = int(params.get("offset", 0))
+        count = int(params.get("count", 100))
+        if not 1 <= count <= 1000:
+            raise _ApiError(400, "COUNT_INVALID")
+        return {"items": list(items)[offset:offset + count]}
+
+    def _next_id(self):
+        self._last_id += 1
+        return self._last_id
+
+    def _api_getMe(self, params):
+        return {"app_id": 1, "name": "Mock App", "payment_processing_bot_username": "CryptoTestnetBot"}
+
+    def _api_createInvoice(self, params):
+        invoice_id = self._next_id()
+        invoice = {
+            "invoice_id": invoice_id,
+            "hash": "IV{:08d}".format(invoice_id),
+            "currency_type": params.get("currency_type", "crypto"),
+            "amount": params.get("amount", "0"),
+            "bot_invoice_url": "https://t.me/CryptoTestnetBot?start=IV{:08d}".format(invoice_id),
+            "status": "active",
+            "created_at": _now(),
+            "allow_comments": params.get("allow_comments", "true").lower() == "true",
+            "allow_anonymous": params.get("allow_anonymous", "true").lower() == "true",
+        }
+        for key in ("asset", "fiat", "accepted_assets", "description", "hidden_message", "paid_btn_name", "paid_btn_url", "payload", "swap_to"):
+            if key in params:
+                invoice[key] = params[key]
+        if "expires_in" in params:
+            invoice["expiration_date"] = _format_date(datetime.now(timezone.utc) + timedelta(seconds = int(params["expires_in"])))
+        self.invoices[invoice_id] = invoice
+        return invoice
+
+    def pay_invoice(self, invoice_id, paid_asset = None, fee_amount = "0"):
+        """
+        Mark invoice as paid, as if a user paid it. Paid amount minus fee is added to the balance.
+        """
+        with self._lock:
+            invoice = self.invoices[invoice_id]
+            invoice["status"] = "paid"
+            invoice["paid_at"] = _now()
+            invoice["paid_asset"] = paid_asset or invoice.get("asset", "USDT")
+            invoice["paid_amount"] = invoice["amount"]
+            invoice["fee_asset"] = invoice["paid_asset"]
+            invoice["fee_amount"] = str(fee_amount)
+            asset = invoice["paid_asset"]
+            self.balances[asset] = str(Decimal(self.balances.get(asset, "0")) + Decimal(invoice["paid_amount"]) - Decimal(invoice["fee_amount"]))
+            return dict(invoice)
+
+    def expire_invoice(self, invoice_id):
+        """
+        Mark active invoice as expired.
+        """
+        with self._lock:
+            invoice = self.invoices[invoice_id]
+            invoice["status"] = "expired"
+            return dict(invoice)
+
+    def _api_getInvoices(self, params):
+        return self._page(self.invoices, params, "invoice_id", ("asset", "fiat", "status"))
+
+    def _api_deleteInvoice(self, params):
+        if self.invoices.pop(int(params.get("invoice_id", 0)), None) is None:
+            raise _ApiError(400, "INVOICE_NOT_FOUND")
+        return True
+
+    def _api_transfer(self, params):
+        spend_id = params.get("spend_id")
+        if not spend_id:
+            raise _ApiError(400, "SPEND_ID_REQUIRED")
+        if any(transfer["spend_id"] == spend_id for transfer in self.transfers.values()):
+            raise _ApiError(400, "SPEND_ID_ALREADY_USED")
+        self._withdraw(params.get("asset"), params.get("amount"))
+        transfer_id = self._next_id()
+        transfer = {
+            "transfer_id": transfer_id,
+            "spend_id": spend_id,
+            "user_id": int(params.get("user_id", 0)),
+            "asset": params.get("asset"),
+            "amount": params.get("amount"),
+            "status": "completed",
+            "completed_at": _now(),
+        }
+        if params.get("comment"):
+            transfer["comment"] = params["comment"]
+        self.transfers[transfer_id] = transfer
+        return transfer
+
+    def _withdraw(self, asset, amount):
+        if asset not in self.balances:
+            raise _ApiError(400, "ASSET_INVALID")
+        try:
+            amount = Decimal(amount)
+        except (TypeError, ValueError, InvalidOperation):
+            raise _ApiError(400, "AMOUNT_INVALID")
+        if amount > Decimal(self.balances[asset]):
+            raise _ApiError(400, "INSUFFICIENT_FUNDS")
+        self.balances[asset] = str(Decimal(self.balances[asset]) - amount)
+        return amount
+
+    def _api_getTransfers(self, params):
+        return self._page(self.transfers, params, "transfer_id", ("asset", "spend_id"))
+
+    def _api_createCheck(self, params):
+        # Amount of active check is on hold
+        amount = self._withdraw(params.get("asset"), params.get("amount"))
+        self.onhold[params["asset"]] = str(Decimal(self.onhold[params["asset"]]) + amount)
+        check_id = self._next_id()
+        check = {
+            "check_id": check_id,
+            "hash": "CQ{:08d}".format(check_id),
+            "asset": params.get("asset"),
+            "amount": params.get("amount"),
+            "bot_check_url": "https://t.me/CryptoTestnetBot?start=CQ{:08d}".format(check_id),
+            "status": "active",
+            "created_at": _now(),
+        }
+        self.checks[check_id] = check
+        return check
+
+    def _api_getChecks(self, params):
+        return self._page(self.checks, params, "check_id", ("asset", "status"))
+
+    def _api_deleteCheck(self, params):
+        check = self.checks.pop(int(params.get("check_id", 0)), None)
+        if check is None:
+            raise _ApiError(400, "CHECK_NOT_FOUND")
+        self.balances[check["asset"]] = str(Decimal(self.balances[check["asset"]]) + Decimal(check["amount"]))
+        self.onhold[check["asset"]] = str(Decimal(self.onhold[check["asset"]]) - Decimal(check["amount"]))
+        return True
+
+    def _api_getBalance(self, params):
+        return [{"currency_code": asset, "available": amount, "onhold": self.onhold.get(asset, "0")} for asset, amount in self.balances.items()]
+
+    def _api_getExchangeRates(self, params):
+        rates = []
+        for source, rate in self.rates.items():
+            for target, target_rate in (("USD", "1"), ("EUR", "0.92")):
+                rates.append({"is_valid": True, "is_crypto": True, "is_fiat": False, "source": source, "target": target,
+                              "rate": str(float(rate) * float(target_rate))})
+        return rates
+
+    def _api_getCurrencies(self, params):
+        return [{"is_blockchain": True, "is_stablecoin": asset == "USDT", "is_fiat": False, "name": asset, "code": asset, "decimals": 8}
+                for asset in self.balances]
+
+    def _api_getStats(self, params):
+        paid = [invoice for invoice in self.invoices.values() if invoice["status"] == "paid"]
+        return {
+            "volume": sum(float(invoice.get("amount", 0)) for invoice in paid),
+            "conversion": len(paid) / len(self.invoices) if self.invoices else 0,
+            "unique_users_count": 0,
+            "created_invoice_count": len(self.invoices),
+            "paid_invoice_count": len(paid),
+            "start_at": params.get("start_at", _now()),
+            "end_at": params.get("end_at", _now()),
+        }
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 1024
+
+
+class _ApiError(Exception):
+    def __init__(self, code, name):
+        self.code = code
+        self.name = name
+        super().__init__(name)
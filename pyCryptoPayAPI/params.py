@@ -0,0 +1,242 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+ASSETS = ("USDT", "TON", "BTC", "ETH", "LTC", "BNB", "TRX", "USDC")
+# "JET" is available on testnet only
+KNOWN_ASSETS = frozenset(ASSETS + ("JET",))
+# Assets invoices may be swapped to after payment
+SWAP_ASSETS = ("USDT", "TON", "TRX", "ETH", "SOL", "BTC", "LTC")
+KNOWN_FIATS = frozenset((
+    "USD", "EUR", "RUB", "BYN", "UAH", "GBP", "CNY", "KZT", "UZS", "GEL",
+    "TRY", "AMD", "THB", "INR", "BRL", "IDR", "AZN", "AED", "PLN", "ILS",
+))
+PAID_BTN_NAMES = frozenset(("viewItem", "openChannel", "openBot", "callback"))
+
+
+class ParamError(ValueError):
+    """
+    Invalid API method parameter. Name mimics server errors, e.g. EXPIRES_IN_INVALID.
+    """
+    def __init__(self, param, message):
+        self.param = param
+        self.name = "{}_INVALID".format(param.upper())
+        self.message = "Parameter {} {}".format(param, message)
+        super().__init__(self.message)
+
+
+class _FieldError(Exception):
+    pass
+
+
+# Field validators: take value, return serialized value or raise _FieldError
+
+def _int(min_value = None, max_value = None):
+    def check(value):
+        if isinstance(value, (bool, float)):
+            raise _FieldError("integer expected")
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise _FieldError("integer expected")
+        if min_value is not None and number < min_value or max_value is not None and number > max_value:
+            raise _FieldError("must be between {} and {}".format(min_value, max_value) if max_value is not None else "must be at least {}".format(min_value))
+        return number
+    return check
+
+
+def _amount(value):
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise _FieldError("number expected")
+    if not number.is_finite() or number <= 0:
+        raise _FieldError("must be positive")
+    return str(value)
+
+
+def _string(max_length = None, max_bytes = None):
+    def check(value):
+        if not isinstance(value, str):
+            raise _FieldError("string expected")
+        if max_length is not None and len(value) > max_length:
+            raise _FieldError("longer than {} characters".format(max_length))
+        if max_bytes is not None and len(value.encode()) > max_bytes:
+            raise _FieldError("longer than {} bytes".format(max_bytes))
+        return value
+    return check
+
+
+def _choice(values):
+    def check(value):
+        if value not in values:
+            raise _FieldError("must be one of: {}".format(", ".join(sorted(values))))
+        return value
+    return check
+
+
+def _choice_list(values):
+    def check(value):
+        items = value.split(",") if isinstance(value, str) else list(value)
+        for item in items:
+            if item not in values:
+                raise _FieldError("unknown value {}".format(item))
+        return ",".join(items)
+    return check
+
+
+def _ids(value):
+    items = value.split(",") if isinstance(value, str) else [str(item) for item in value]
+    if not all(item.strip().isdigit() for item in items):
+        raise _FieldError("comma separated integer IDs expected")
+    return ",".join(item.strip() for item in items)
+
+
+def _bool(value):
+    if not isinstance(value, bool):
+        raise _FieldError("boolean expected")
+    return "true" if value else "false"
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    try:
+        datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+    except (TypeError, ValueError, AttributeError):
+        raise _FieldError("ISO 8601 date expected")
+    return value
+
+
+def _url(value):
+    _string()(value)
+    if not value.startswith(("https://", "http://")):
+        raise _FieldError("must start with https:// or http://")
+    return value
+
+
+def _required(*names):
+    def check(params):
+        for name in names:
+            if params.get(name) in (None, ""):
+                return name, "is required"
+    return check
+
+
+def _create_invoice_check(params):
+    if params.get("currency_type", "crypto") == "fiat":
+        if not params.get("fiat"):
+            return "fiat", "is required for fiat invoice"
+    elif not params.get("asset"):
+        return "asset", "is required for crypto invoice"
+    if params.get("paid_btn_name") and not params.get("paid_btn_url"):
+        return "paid_btn_url", "is required with paid_btn_name"
+
+
+_ASSET = _choice(KNOWN_ASSETS)
+_FIAT = _choice(KNOWN_FIATS)
+_OFFSET = _int(0)
+_COUNT = _int(1, 1000)
+
+# API method -> (field validators, whole params checks)
+PARAM_SCHEMAS = {
+    "createInvoice": ({
+        "currency_type": _choice(("crypto", "fiat")),
+        "asset": _ASSET,
+        "fiat": _FIAT,
+        "accepted_assets": _choice_list(KNOWN_ASSETS),
+        "amount": _amount,
+        "description": _string(1024),
+        "hidden_message": _string(2048),
+        "paid_btn_name": _choice(PAID_BTN_NAMES),
+        "paid_btn_url": _url,
+        "payload": _string(max_bytes = 4096),
+        "allow_comments": _bool,
+        "allow_anonymous": _bool,
+        "expires_in": _int(1, 2678400),
+        "swap_to": _choice(SWAP_ASSETS),
+    }, (_required("amount"), _create_invoice_check)),
+    "deleteInvoice": ({"invoice_id": _int(1)}, (_required("invoice_id"),)),
+    "transfer": ({
+        "user_id": _int(1),
+        "asset": _ASSET,
+        "amount": _amount,
+        "spend_id": _string(64),
+        "comment": _string(1024),
+        "disable_send_notification": _bool,
+    }, (_required("user_id", "asset", "amount", "spend_id"),)),
+    "getInvoices": ({
+        "asset": _ASSET,
+        "fiat": _FIAT,
+        "invoice_ids": _ids,
+        "status": _choice(("active", "paid", "expired")),
+        "offset": _OFFSET,
+        "count": _COUNT,
+    }, ()),
+    "getChecks": ({
+        "asset": _ASSET,
+        "check_ids": _ids,
+        "status": _choice(("active", "activated")),
+        "offset": _OFFSET,
+        "count": _COUNT,
+    }, ()),
+    "getTransfers": ({
+        "asset": _ASSET,
+        "transfer_ids": _ids,
+        "spend_id": _string(64),
+        "offset": _OFFSET,
+        "count": _COUNT,
+    }, ()),
+    "createCheck": ({
+        "asset": _ASSET,
+        "amount": _amount,
+        "pin_to_user_id": _int(1),
+        "pin_to_username": _string(),
+    }, (_required("asset", "amount"),)),
+    "deleteCheck": ({"check_id": _int(1)}, (_required("check_id"),)),
+    "getStats": ({"start_at": _date, "end_at": _date}, ()),
+    "getMe": ({}, ()),
+    "getBalance": ({}, ()),
+    "getExchangeRates": ({}, ()),
+    "getCurrencies": ({}, ()),
+}
+
+
+def _compile(fields, checks):
+    fields = dict(fields)
+    checks = tuple(checks)
+
+    def validate(params):
+        result = {}
+        for name, value in params.items():
+            validator = fields.get(name)
+            if validator is None:
+                raise ParamError(name, "is unknown")
+            try:
+                result[name] = validator(value)
+            except _FieldError as e:
+                raise ParamError(name, e.args[0])
+        for check in checks:
+            error = check(params)
+            if error:
+                raise ParamError(*error)
+        return result
+    return validate
+
+
+# Compiled once at import
+_VALIDATORS = {method: _compile(fields, checks) for method, (fields, checks) in PARAM_SCHEMAS.items()}
+
+
+def check_params(method, params):
+    """
+    Validate and serialize params of API method locally.
+    Raises ParamError on invalid params. Methods without schema are passed as is.
+
+    :param method: API method name
+    :param params: Dict of API method params
+    :return: Dict of serialized params
+    """
+    validator = _VALIDATORS.get(method)
+    if validator is None:
+        return params
+    return validator(params)
@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import json
+from decimal import Decimal
+from .api import pyCryptoPayException
+from .bulk import run_bulk
+
+REPORT_FIELDS = ("user_id", "asset", "amount", "spend_id", "status", "transfer_id", "error_code", "error_name", "error_message")
+
+
+def make_spend_id(run_id, user_id, asset, amount, key = 0):
+    """
+    Build deterministic spend_id (64 hex symbols) for transfer of payout run.
+
+    :param run_id: ID of the payout run
+    :param user_id: Telegram user ID
+    :param asset: Cryptocurrency code
+    :param amount: Amount of the transfer
+    :param key: (Optional) Distinguishes several equal transfers to the same user within the run
+    """
+    source = "{}:{}:{}:{}:{}".format(run_id, user_id, asset, Decimal(str(amount)).normalize(), key)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+class PayoutRunner:
+    """
+    Mass payout via transfer method.
+    Rows (user_id, asset, amount[, comment]) get deterministic spend_ids, so repeating the same run
+    never pays twice. Transfers are sent in parallel (use client rate_limiter to cap the rate),
+    results are streamed to CSV or JSONL report.
+    """
+
+    def __init__(self, client, run_id, max_workers = 8, check_balance = True, disable_send_notification = None, ledger = None, resume = False):
+        """
+        Create the PayoutRunner instance.
+
+        :param client: pyCryptoPayAPI instance.
+        :param run_id: (String) Unique ID of the payout run, part of spend_ids. Use the same ID to resume the run.
+        :param max_workers: (Optional) Max number of parallel transfers. Default is 8. Keep client pool_size not less than this.
+        :param check_balance: (Optional) Check balance of every asset before sending any transfer. Default is True.
+        :param disable_send_notification: (Optional) Passed to transfer method.
+        :param ledger: (Optional) BalanceLedger instance: balance is checked locally and transfers are applied to it.
+        :param resume: (Optional) The run with this run_id was started before. If balance looks short, rows are looked up via getTransfers
+            (one request per row) and rows already paid are not counted. Not needed with client transfer_journal. Default is False.
+        """
+        self.client = client
+        self.run_id = run_id
+        self.max_workers = max_workers
+        self.check_balance = check_balance
+        self.disable_send_notification = disable_send_notification
+        self.ledger = ledger
+        self.resume = resume
+
+    def prepare(self, rows):
+        """
+        Convert rows to list of transfer dicts with spend_ids.
+
+        :param rows: Iterable of (user_id, asset, amount) or (user_id, asset, amount, comment) tuples, or dicts with these keys.
+        """
+        transfers = []
+        seen = {}
+        for row in rows:
+            if isinstance(row, dict):
+                user_id, asset, amount, comment = row["user_id"], row["asset"], row["amount"], row.get("comment")
+            else:
+                user_id, asset, amount = row[0], row[1], row[2]
+                comment = row[3] if len(row) > 3 else None
+            base = (user_id, asset, Decimal(str(amount)))
+            key = seen.get(base, 0)
+            seen[base] = key + 1
+            transfers.append({
+                "user_id": user_id,
+                "asset": asset,
+                "amount": str(amount),
+                "comment": comment,
+                "spend_id": make_spend_id(self.run_id, user_id, asset, amount, key),
+            })
+        return transfers
+
+    @staticmethod
+    def _required(transfers):
+        required = {}
+        for transfer in transfers:
+            required[transfer["asset"]] = required.get(transfer["asset"], Decimal(0)) + Decimal(transfer["amount"])
+        return required
+
+    def _shortage(self, required):
+        if self.ledger is not None:
+            return ["{} {} > {}".format(asset, amount, self.ledger.available(asset)) for asset, amount in required.items() if not self.ledger.has_funds(asset, amount)]
+        available = {}
+        for balance in self.client.get_balance():
+            if isinstance(balance, dict):
+                available[balance["currency_code"]] = Decimal(str(balance["available"]))
+            else:
+                available[balance.currency_code] = Decimal(str(balance.available))
+        return ["{} {} > {}".format(asset, amount, available.get(asset, 0)) for asset, amount in required.items() if amount > available.get(asset, 0)]
+
+    def _check_balance(self, transfers):
+        # Rows of a resumed run which are already paid do not need balance
+        journal = getattr(self.client, "transfer_journal", None)
+        if journal is not None:
+            transfers = [transfer for transfer in transfers if (journal.get(transfer["spend_id"]) or (None,))[0] != journal.DONE]
+        short = self._shortage(self._required(transfers))
+        if short and self.resume:
+            # Not known locally (no journal or another process): look the rows up via getTransfers before failing
+            sent = set(spend_id for spend_id, items, error in run_bulk(
+                lambda spend_id: self.client.get_transfers(spend_id = spend_id), [transfer["spend_id"] for transfer in transfers], self.max_workers) if items)
+            if sent:
+                short = self._shortage(self._required([transfer for transfer in transfers if transfer["spend_id"] not in sent]))
+        if short:
+            raise pyCryptoPayException(-8, "INSUFFICIENT_BALANCE", "Not enough balance: {}".format(", ".join(short)))
+
+    def _send(self, transfer):
+        result = dict((key, transfer[key]) for key in ("user_id", "asset", "amount", "spend_id"))
+        try:
+            sent = (self.ledger or self.client).transfer(
+                transfer["user_id"], transfer["asset"], transfer["amount"], transfer["spend_id"],
+                comment = transfer["comment"], disable_send_notification = self.disable_send_notification)
+            result["status"] = "done"
+            result["transfer_id"] = sent["transfer_id"] if isinstance(sent, dict) else sent.transfer_id
+        except pyCryptoPayException as pe:
+            result["status"] = "failed"
+            result["error_code"] = pe.code
+            result["error_name"] = pe.name
+            result["error_message"] = pe.message
+        return result
+
+    def iter_run(self, rows):
+        """
+        Send transfers and yield result dict for each row as soon as it is done (not in input order).
+        Raises pyCryptoPayException (-8) before sending anything if balance is not enough.
+        Rows already paid by an earlier run with the same run_id are not counted in the balance check
+        if client transfer_journal knows them, or with resume=True (looked up via getTransfers when balance seems short).
+
+        :param rows: Same as in prepare()
+        :return: Generator of dicts with REPORT_FIELDS keys
+        """
+        transfers = self.prepare(rows)
+        if self.check_balance and transfers:
+            self._check_balance(transfers)
+        # _send reports errors in the result dict, so there is no exception to check
+        for transfer, result, error in run_bulk(self._send, transfers, self.max_workers):
+            yield result
+
+    def run(self, rows, report = None):
+        """
+        Send transfers and write results to report.
+
+        :param rows: Same as in prepare()
+        :param report: (Optional) Report file path; .csv for CSV, otherwise JSON lines. Results are written as they come.
+        :return: Dict with counts: {"done": N, "failed": N}
+        """
+        summary = {"done": 0, "failed": 0}
+        report_file = open(report, "w", newline = "", encoding = "utf-8") if report else None
+        try:
+            writer = None
+            if report_file and report.lower().endswith(".csv"):
+                writer = csv.DictWriter(report_file, fieldnames = REPORT_FIELDS)
+                writer.writeheader()
+            for result in self.iter_run(rows):
+                summary[result["status"]] += 1
+                if writer:
+                    writer.writerow(result)
+                elif report_file:
+                    report_file.write(json.dumps(result) + "\n")
+                if report_file:
+                    report_file.flush()
+        finally:
+            if report_file:
+                report_file.close()
+        return summary
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from .api import pyCryptoPayAPI
+from .bulk import run_bulk
+from .ratelimit import RateLimiter, CombinedRateLimiter
+
+
+class ClientPool:
+    """
+    Registry of pyCryptoPayAPI clients for many apps (API tokens) in one process.
+    All clients share one connection pool and an optional global rate limiter, each token has its own limiter.
+    Least recently used clients are dropped above max_clients or after idle_timeout.
+    """
+
+    def __init__(self, pool_size = 50, rate = 30, max_concurrency = 8, global_rate = None, global_concurrency = None, max_clients = 1000, idle_timeout = None, **client_kwargs):
+        """
+        Create the ClientPool instance.
+
+        :param pool_size: (Optional) Max number of keep-alive connections shared by all clients. Default is 50.
+        :param rate: (Optional) Requests per second per token, None to disable. Default is 30.
+        :param max_concurrency: (Optional) Max parallel requests per token, None to disable. Default is 8.
+        :param global_rate: (Optional) Requests per second of all tokens together. Default is no limit.
+        :param global_concurrency: (Optional) Max parallel requests of all tokens together. Default is no limit.
+        :param max_clients: (Optional) Max number of clients kept, least recently used are dropped. Default is 1000.
+        :param idle_timeout: (Optional) Drop clients not used for this many seconds. Default is to keep them.
+        :param client_kwargs: (Optional) Other pyCryptoPayAPI parameters (result_as_class, test_net, timeout, cache, retry_policy, ...).
+        """
+        self.pool_size = pool_size
+        self.rate = rate
+        self.max_concurrency = max_concurrency
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.client_kwargs = client_kwargs
+        self.session = pyCryptoPayAPI._create_session(pool_size)
+        self.global_limiter = None
+        if global_rate is not None or global_concurrency is not None:
+            self.global_limiter = RateLimiter(rate = global_rate, max_concurrency = global_concurrency)
+        self.evicted = 0
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _create_client(self, api_token):
+        limiter = None
+        if self.rate is not None or self.max_concurrency is not None:
+            limiter = RateLimiter(rate = self.rate, max_concurrency = self.max_concurrency)
+        if limiter is not None and self.global_limiter is not None:
+            limiter = CombinedRateLimiter(limiter, self.global_limiter)
+        elif limiter is None:
+            limiter = self.global_limiter
+        return pyCryptoPayAPI(api_token, session = self.session, rate_limiter = limiter, **self.client_kwargs)
+
+    def _evict(self, now):
+        # Called under lock
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last = False)
+            self.evicted += 1
+        if self.idle_timeout is not None:
+            while self._clients:
+                _, used_at = next(iter(self._clients.values()))
+                if now - used_at < self.idle_timeout:
+                    break
+                self._clients.popitem(last = False)
+                self.evicted += 1
+
+    def get(self, api_token):
+        """
+        Return client for the token, creating it if needed.
+        Dropped clients keep working, the next get() just creates a new one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.pop(api_token, None)
+            client = entry[0] if entry is not None else self._create_client(api_token)
+            self._clients[api_token] = (client, now)
+            self._evict(now)
+            return client
+
+    def __getitem__(self, api_token):
+        return self.get(api_token)
+
+    def remove(self, api_token):
+        """
+        Drop client of the token.
+        """
+        with self._lock:
+            self._clients.pop(api_token, None)
+
+    def tokens(self):
+        """
+        Return list of tokens with clients kept, least recently used first.
+        """
+        with self._lock:
+            self._evict(time.monotonic())
+            return list(self._clients)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    def map(self, func, tokens = None, max_workers = 16):
+        """
+        Non-API method
+        Call func(client) for many tokens in parallel.
+
+        :param func: Callable taking pyCryptoPayAPI client
+        :param tokens: (Optional) Iterable of tokens. Defaults to all kept tokens.
+        :param max_workers: (Optional) Max number of parallel calls. Default is 16.
+        :return: Generator of (token, result, exception) tuples in order of completion. Exception is None on success.
+        """
+        tokens = self.tokens() if tokens is None else list(tokens)
+        return run_bulk(lambda token: func(self.get(token)), tokens, max_workers)
+
+    def get_balance_all(self, tokens = None, max_workers = 16):
+        """
+        Non-API method
+        Get balances of many apps in parallel.
+
+        :return: Dict of token -> balances or pyCryptoPayException if the call failed.
+        """
+        return {token: (error if error is not None else result) for token, result, error in self.map(lambda client: client.get_balance(), tokens, max_workers)}
+
+    def get_me_all(self, tokens = None, max_workers = 16):
+        """
+        Non-API method
+        Check tokens of many apps in parallel.
+
+        :return: Dict of token -> app info or pyCryptoPayException if the call failed.
+        """
+        return {token: (error if error is not None else result) for token, result, error in self.map(lambda client: client.get_me(), tokens, max_workers)}
+
+    def close(self):
+        """
+        Drop all clients and close the shared connection pool.
+        """
+        with self._lock:
+            self._clients.clear()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
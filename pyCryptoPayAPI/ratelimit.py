@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Client-side request limiter: token bucket for request rate plus adaptive concurrency limit.
+    Concurrency limit is halved when the server reports overload (HTTP 429/5xx, timeouts), at most once
+    per window of requests in flight, and grows by one after each limit-sized series of successful requests.
+    One instance can be shared by several clients, threads and async tasks.
+    """
+
+    def __init__(self, rate = 30, burst = None, max_concurrency = 32, min_concurrency = 1, initial_concurrency = None, adaptive = True):
+        """
+        Create the RateLimiter instance.
+
+        :param rate: (Optional) Average number of requests per second, None to disable. Default is 30.
+        :param burst: (Optional) Max number of requests sent at once after idle time. Defaults to rate.
+        :param max_concurrency: (Optional) Upper concurrency limit, None to disable. Default is 32.
+        :param min_concurrency: (Optional) Lower concurrency limit. Default is 1.
+        :param initial_concurrency: (Optional) Initial concurrency limit. Defaults to max_concurrency.
+        :param adaptive: (Optional) Adjust concurrency limit by server responses. Default is True.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else (rate or 1)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = initial_concurrency if initial_concurrency is not None else max_concurrency
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.overloads = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._successes = 0
+        # Releases of requests sent before the last decrease, their overloads do not decrease again
+        self._window = 0
+        self._condition = threading.Condition()
+
+    def _take_token(self):
+        # Returns seconds to wait before the token is available (the token is reserved anyway)
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def _has_slot(self):
+        return self.max_concurrency is None or self.in_flight < self.concurrency
+
+    def acquire(self):
+        """
+        Block until request can be sent. Call release() after the request.
+        """
+        with self._condition:
+            while not self._has_slot():
+                self._condition.wait()
+            self.in_flight += 1
+            wait = self._take_token()
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            except BaseException:
+                self.cancel()
+                raise
+
+    async def acquire_async(self):
+        """
+        Async version of acquire(). Call release() after the request.
+        """
+        delay = 0.001
+        while True:
+            with self._condition:
+                if self._has_slot():
+                    self.in_flight += 1
+                    wait = self._take_token()
+                    break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                # Cancelled (e.g. by asyncio.wait_for timeout): give the slot back
+                self.cancel()
+                raise
+
+    def release(self, overloaded = False):
+        """
+        Release request slot.
+
+        :param overloaded: (Optional) True if the server reported overload.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            in_window = self._window > 0
+            if in_window:
+                self._window -= 1
+            if self.adaptive and self.max_concurrency is not None:
+                if overloaded:
+                    self.overloads += 1
+                    self._successes = 0
+                    if not in_window:
+                        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                        self._window = self.in_flight
+                else:
+                    self._successes += 1
+                    if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                        self._successes = 0
+                        self.concurrency += 1
+            self._condition.notify_all()
+
+    def cancel(self):
+        """
+        Release request slot of the request which was not sent.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def stats(self):
+        """
+        Return dict of limiter state.
+        """
+        with self._condition:
+            return {
+                "concurrency": self.concurrency,
+                "in_flight": self.in_flight,
+                "overloads": self.overloads,
+            }
+
+
+class CombinedRateLimiter:
+    """
+    Several limiters applied together, e.g. per-token and global one.
+    A request waits for each limiter in order, so put the narrowest (per-token) limiter first
+    to not hold slots of the shared one while waiting.
+    """
+
+    def __init__(self, *limiters):
+        """
+        Create the CombinedRateLimiter instance.
+
+        :param limiters: RateLimiter instances. None values are skipped.
+        """
+        self.limiters = [limiter for limiter in limiters if limiter is not None]
+
+    def acquire(self):
+        """
+        Block until request can be sent. Call release() after the request.
+        """
+        acquired = []
+        try:
+            for limiter in self.limiters:
+                limiter.acquire()
+                acquired.append(limiter)
+        except BaseException:
+            for limiter in reversed(acquired):
+                limiter.cancel()
+            raise
+
+    async def acquire_async(self):
+        """
+        Async version of acquire(). Call release() after the request.
+        """
+        acquired = []
+        try:
+            for limiter in self.limiters:
+                await limiter.acquire_async()
+                acquired.append(limiter)
+        except BaseException:
+            for limiter in reversed(acquired):
+                limiter.cancel()
+            raise
+
+    def release(self, overloaded = False):
+        """
+        Release request slot in all limiters.
+
+        :param overloaded: (Optional) True if the server reported overload.
+        """
+        for limiter in reversed(self.limiters):
+            limiter.release(overloaded)
+
+    def cancel(self):
+        """
+        Release request slot of the request which was not sent in all limiters.
+        """
+        for limiter in reversed(self.limiters):
+            limiter.cancel()
@@ -0,0 +1,109 @@
+from decimal import Decimal
+
+
+class ExchangeRateTable:
+    """
+    Exchange rates indexed by (source, target) pair.
+    Inverse and cross rates (via pivot currencies) are derived when there is no direct pair.
+    """
+
+    def __init__(self, rates, pivots = ("USD", "USDT"), only_valid = True):
+        """
+        Create the ExchangeRateTable instance.
+
+        :param rates: List of exchange rates as returned by get_exchange_rates (dicts or ExchangeRate instances).
+        :param pivots: (Optional) Currencies to try first when deriving cross rates. Default is ("USD", "USDT").
+        :param only_valid: (Optional) Skip rates that are not up-to-date (is_valid is false). Default is True.
+        """
+        self.pivots = tuple(pivots)
+        self._direct = {}
+        self._graph = {}
+        self._derived = {}
+        for item in rates:
+            if isinstance(item, dict):
+                source, target, rate, is_valid = item.get("source"), item.get("target"), item.get("rate"), item.get("is_valid")
+            else:
+                source, target, rate, is_valid = item.source, item.target, item.rate, item.is_valid
+            if only_valid and is_valid is False:
+                continue
+            rate = Decimal(str(rate))
+            if not rate:
+                continue
+            self._direct[(source, target)] = rate
+            self._graph.setdefault(source, {})[target] = rate
+            # Do not overwrite direct rate with inverse one
+            if source not in self._graph.setdefault(target, {}):
+                self._graph[target][source] = 1 / rate
+
+    def __contains__(self, pair):
+        try:
+            self.rate(*pair)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self):
+        return len(self._direct)
+
+    @property
+    def pairs(self):
+        """
+        List of (source, target) pairs received from API.
+        """
+        return list(self._direct)
+
+    def rate(self, source, target):
+        """
+        Get rate of source currency valued in target currency.
+
+        :param source: Currency code to convert from.
+        :param target: Currency code to convert to.
+        :return: Decimal rate. Raises KeyError if the rate can not be derived.
+        """
+        if source == target:
+            return Decimal(1)
+        pair = (source, target)
+        rate = self._derived.get(pair)
+        if rate is None:
+            rate = self._find_rate(source, target)
+            self._derived[pair] = rate
+        return rate
+
+    def _find_rate(self, source, target):
+        # Breadth-first search for the shortest chain of known rates, pivots first
+        if source not in self._graph:
+            raise KeyError("No exchange rate for {} -> {}".format(source, target))
+        visited = {source: Decimal(1)}
+        queue = [source]
+        while queue:
+            next_queue = []
+            for currency in queue:
+                edges = self._graph[currency]
+                if target in edges:
+                    return visited[currency] * edges[target]
+                for middle in [c for c in self.pivots if c in edges] + [c for c in edges if c not in self.pivots]:
+                    if middle not in visited:
+                        visited[middle] = visited[currency] * edges[middle]
+                        next_queue.append(middle)
+            queue = next_queue
+        raise KeyError("No exchange rate for {} -> {}".format(source, target))
+
+    def convert(self, amount, source, target):
+        """
+        Convert amount from source to target currency.
+
+        :param amount: Amount (Decimal, String, Number).
+        :param source: Currency code to convert from.
+        :param target: Currency code to convert to.
+        :return: Decimal amount.
+        """
+        return Decimal(str(amount)) * self.rate(source, target)
+
+    def convert_many(self, amounts, source, target):
+        """
+        Convert list of amounts from source to target currency.
+
+        :return: List of Decimal amounts.
+        """
+        rate = self.rate(source, target)
+        return [Decimal(str(amount)) * rate for amount in amounts]
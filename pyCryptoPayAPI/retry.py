@@ -0,0 +1,225 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from .api import pyCryptoPayException
+
+# Methods safe to repeat: reads and transfer (idempotent by spend_id).
+# createInvoice, createCheck and deletes are never retried: a lost response does not mean the call failed.
+DEFAULT_RETRY_METHODS = (
+    "getMe", "getInvoices", "getChecks", "getTransfers", "getBalance",
+    "getExchangeRates", "getCurrencies", "getStats", "transfer",
+)
+
+
+class RetryPolicy:
+    """
+    Retry failed requests with exponential backoff and jitter within total deadline.
+    Only network errors, undecodable responses, HTTP 429 and 5xx errors are retried.
+    """
+
+    def __init__(self, max_attempts = 4, base_delay = 0.5, max_delay = 8, deadline = 30, jitter = True, methods = DEFAULT_RETRY_METHODS):
+        """
+        Create the RetryPolicy instance.
+
+        :param max_attempts: (Optional) Max number of attempts including the first one. Default is 4.
+        :param base_delay: (Optional) Delay before the first retry in seconds, doubled for each next one. Default is 0.5.
+        :param max_delay: (Optional) Max delay between attempts in seconds. Default is 8.
+        :param deadline: (Optional) Total time budget for all attempts in seconds, None for no limit. Default is 30.
+        :param jitter: (Optional) Randomize delays (full jitter) to spread retries of concurrent calls. Default is True.
+        :param methods: (Optional) API methods which may be retried. Default is DEFAULT_RETRY_METHODS.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.jitter = jitter
+        self.methods = frozenset(methods)
+        self.retries = 0
+
+    @staticmethod
+    def is_retryable_error(error):
+        """
+        Check if pyCryptoPayException is a temporary failure.
+        """
+        code = error.code
+        return code in (-2, -3) or code == 429 or (isinstance(code, int) and code >= 500)
+
+    def _next_delay(self, method, error, attempt, started):
+        # Returns delay before the next attempt or None if the error has to be raised
+        if method not in self.methods or attempt >= self.max_attempts or not self.is_retryable_error(error):
+            return None
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if self.deadline is not None and time.monotonic() + delay - started >= self.deadline:
+            return None
+        self.retries += 1
+        return delay
+
+    def call(self, method, func):
+        """
+        Call func() with retries for API method.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func()
+            except pyCryptoPayException as pe:
+                delay = self._next_delay(method, pe, attempt, started)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def call_async(self, method, func):
+        """
+        Async version of call(): func() returns coroutine.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func()
+            except pyCryptoPayException as pe:
+                delay = self._next_delay(method, pe, attempt, started)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+
+class TransferJournal:
+    """
+    Local SQLite journal of transfer spend_ids.
+    Transfers already completed are not sent again, transfers interrupted by crash are looked up
+    via getTransfers before resending. Oldest completed records are pruned above max_entries.
+    """
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path = ":memory:", max_entries = 100000):
+        """
+        Create the TransferJournal instance.
+
+        :param path: (Optional) SQLite database file path. Default is in-memory database.
+        :param max_entries: (Optional) Max number of completed transfers kept. Default is 100000.
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread = False)
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS transfers (spend_id TEXT PRIMARY KEY, state TEXT NOT NULL, result TEXT, updated_at REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS transfers_state ON transfers (state, updated_at)")
+        self._done_since_prune = 0
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._db.close()
+
+    def get(self, spend_id):
+        """
+        Return (state, result) for spend_id or None if it is unknown.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT state, result FROM transfers WHERE spend_id = ?", (spend_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], (json.loads(row[1]) if row[1] else None)
+
+    def pending(self):
+        """
+        Return list of spend_ids of transfers interrupted before their result was known.
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT spend_id FROM transfers WHERE state = ?", (self.PENDING,))]
+
+    def _set(self, spend_id, state, result = None):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO transfers (spend_id, state, result, updated_at) VALUES (?, ?, ?, ?)",
+                             (spend_id, state, json.dumps(result) if result is not None else None, time.time()))
+            if state == self.DONE:
+                self._done_since_prune += 1
+                if self._done_since_prune >= max(1, self.max_entries // 10):
+                    self._done_since_prune = 0
+                    self._db.execute(
+                        "DELETE FROM transfers WHERE state = ? AND spend_id NOT IN "
+                        "(SELECT spend_id FROM transfers WHERE state = ? ORDER BY updated_at DESC LIMIT ?)",
+                        (self.DONE, self.DONE, self.max_entries))
+
+    def run(self, spend_id, send, lookup):
+        """
+        Perform transfer through the journal.
+
+        :param spend_id: Transfer spend_id
+        :param send: Callable sending the transfer, returns raw result
+        :param lookup: Callable returning raw transfer with this spend_id from API or None
+        :return: Raw transfer result
+        """
+        record = self.get(spend_id)
+        if record is not None:
+            state, result = record
+            if state == self.DONE:
+                return result
+            if state == self.PENDING:
+                # Interrupted earlier: the transfer may have been accepted
+                result = lookup()
+                if result:
+                    self._set(spend_id, self.DONE, result)
+                    return result
+        self._set(spend_id, self.PENDING)
+        try:
+            result = send()
+            error = None
+        except pyCryptoPayException as pe:
+            error = pe
+        if error is not None:
+            # The transfer may have been accepted by an earlier attempt with lost response
+            try:
+                result = lookup()
+            except pyCryptoPayException:
+                # Outcome is unknown: keep pending to check again on the next run
+                raise error
+            if not result:
+                self._set(spend_id, self.FAILED)
+                raise error
+        self._set(spend_id, self.DONE, result)
+        return result
+
+    async def run_async(self, spend_id, send, lookup):
+        """
+        Async version of run(): send() and lookup() return coroutines.
+        """
+        record = self.get(spend_id)
+        if record is not None:
+            state, result = record
+            if state == self.DONE:
+                return result
+            if state == self.PENDING:
+                result = await lookup()
+                if result:
+                    self._set(spend_id, self.DONE, result)
+                    return result
+        self._set(spend_id, self.PENDING)
+        try:
+            result = await send()
+            error = None
+        except pyCryptoPayException as pe:
+            error = pe
+        if error is not None:
+            try:
+                result = await lookup()
+            except pyCryptoPayException:
+                raise error
+            if not result:
+                self._set(spend_id, self.FAILED)
+                raise error
+        self._set(spend_id, self.DONE, result)
+        return result
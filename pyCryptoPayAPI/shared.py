@@ -0,0 +1,275 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from .cache import DEFAULT_CACHE_TTL, TTLCache
+
+
+class _SharedDb:
+    # SQLite connection reopened in each process, so the object may be created before fork
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self._pid = None
+        self._db = None
+        self._lock = threading.Lock()
+
+    def connection(self):
+        # Called under self._lock
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout = self.timeout, isolation_level = None, check_same_thread = False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._db
+
+    def transaction(self, func):
+        """
+        Run func(connection) in exclusive write transaction.
+        """
+        with self._lock:
+            db = self.connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(db)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return result
+
+    def query(self, sql, params = ()):
+        with self._lock:
+            return self.connection().execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
+            self._pid = None
+
+
+class SharedTTLCache:
+    """
+    TTLCache stored in SQLite file shared by several processes (e.g. gunicorn/uwsgi workers).
+    Pass an instance to pyCryptoPayAPI(cache=...) or AsyncCryptoPayAPI(cache=...). Results are stored as JSON.
+    While one process refreshes an expired value, others get the stale value within stale_ttl.
+    """
+
+    def __init__(self, path, ttl = None, stale_ttl = 30, refresh_timeout = 30, timeout = 10):
+        """
+        Create the SharedTTLCache instance.
+
+        :param path: SQLite database file path, the same for all processes.
+        :param ttl: (Optional) Dict of API method name -> TTL in seconds. Only listed methods are cached. Defaults to DEFAULT_CACHE_TTL.
+        :param stale_ttl: (Optional) Seconds an expired value is still returned while another process refreshes it. Default is 30.
+        :param refresh_timeout: (Optional) Seconds after which refresh of crashed process is taken over. Default is 30.
+        :param timeout: (Optional) Seconds to wait for database lock. Default is 10.
+        """
+        self.ttl = dict(DEFAULT_CACHE_TTL if ttl is None else ttl)
+        self.stale_ttl = stale_ttl
+        self.refresh_timeout = refresh_timeout
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._db = _SharedDb(path, timeout)
+        self._db.transaction(lambda db: db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, method TEXT NOT NULL, value TEXT, expires_at REAL, refresh_until REAL)"))
+
+    def is_cached(self, method):
+        """
+        Check if results of API method are cached.
+        """
+        return method in self.ttl
+
+    def _begin(self, key, method):
+        # Returns (cached value or None, True if this process has to load, True if value is stale)
+        def check(db):
+            now = time.time()
+            row = db.execute("SELECT value, expires_at, refresh_until FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] is not None:
+                value, expires_at, refresh_until = row
+                if now < expires_at:
+                    return value, False, False
+                if now < expires_at + self.stale_ttl and refresh_until is not None and now < refresh_until:
+                    # Another process is refreshing
+                    return value, False, True
+            elif row is not None and row[2] is not None and now < row[2]:
+                # Another process is loading the first value: wait for it
+                return None, False, False
+            db.execute("INSERT INTO cache (key, method, refresh_until) VALUES (?, ?, ?) "
+                       "ON CONFLICT (key) DO UPDATE SET refresh_until = excluded.refresh_until",
+                       (key, method, now + self.refresh_timeout))
+            return None, True, False
+
+        return self._db.transaction(check)
+
+    def _hit(self, value, stale):
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return json.loads(value)
+
+    def _store(self, key, method, result):
+        self._db.transaction(lambda db: db.execute(
+            "UPDATE cache SET value = ?, expires_at = ?, refresh_until = NULL WHERE key = ?",
+            (json.dumps(result), time.time() + self.ttl[method], key)))
+        return result
+
+    def _abort(self, key):
+        self._db.transaction(lambda db: db.execute("UPDATE cache SET refresh_until = NULL WHERE key = ?", (key,)))
+
+    def get_or_load(self, method, params, loader):
+        """
+        Return cached value for method and params, calling loader() on miss.
+
+        :param method: API method name
+        :param params: Dict of API method params
+        :param loader: Callable returning fresh JSON-serializable value. Exceptions are not cached.
+        """
+        key = json.dumps(TTLCache.make_key(method, params))
+        delay = 0.01
+        while True:
+            value, load, stale = self._begin(key, method)
+            if load or value is not None:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        if not load:
+            return self._hit(value, stale)
+        self.misses += 1
+        try:
+            result = loader()
+        except BaseException:
+            self._abort(key)
+            raise
+        return self._store(key, method, result)
+
+    async def get_or_load_async(self, method, params, loader):
+        """
+        Async version of get_or_load(): loader() returns coroutine.
+        Database calls, which may wait for the lock of another process, run in a thread to not block the event loop.
+        """
+        key = json.dumps(TTLCache.make_key(method, params))
+        delay = 0.01
+        while True:
+            value, load, stale = await asyncio.to_thread(self._begin, key, method)
+            if load or value is not None:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        if not load:
+            return self._hit(value, stale)
+        self.misses += 1
+        try:
+            result = await loader()
+        except BaseException:
+            await asyncio.to_thread(self._abort, key)
+            raise
+        return await asyncio.to_thread(self._store, key, method, result)
+
+    def invalidate(self, method = None):
+        """
+        Drop cached values in all processes.
+
+        :param method: (Optional) API method name to drop values for. Drops everything if not set.
+        """
+        if method is None:
+            self._db.transaction(lambda db: db.execute("DELETE FROM cache"))
+        else:
+            self._db.transaction(lambda db: db.execute("DELETE FROM cache WHERE method = ?", (method,)))
+
+    def stats(self):
+        """
+        Return dict of cache counters of this process (size is shared).
+        """
+        size = self._db.query("SELECT COUNT(*) FROM cache WHERE value IS NOT NULL")[0][0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "size": size,
+        }
+
+    def close(self):
+        """
+        Close the database connection of this process.
+        """
+        self._db.close()
+
+
+class SharedRateLimiter:
+    """
+    Token bucket kept in SQLite file shared by several processes, so they together send at most rate requests per second.
+    Pass an instance to pyCryptoPayAPI(rate_limiter=...). Concurrency is not limited across processes:
+    combine with a local RateLimiter(rate=None, max_concurrency=N) via CombinedRateLimiter if needed.
+    """
+
+    def __init__(self, path, rate = 30, burst = None, name = "default", timeout = 10):
+        """
+        Create the SharedRateLimiter instance.
+
+        :param path: SQLite database file path, the same for all processes.
+        :param rate: (Optional) Average number of requests per second of all processes. Default is 30.
+        :param burst: (Optional) Max number of requests sent at once after idle time. Defaults to rate.
+        :param name: (Optional) Bucket name, several buckets may be kept in one file. Default is "default".
+        :param timeout: (Optional) Seconds to wait for database lock. Default is 10.
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.name = name
+        self.overloads = 0
+        self._db = _SharedDb(path, timeout)
+        self._db.transaction(lambda db: db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"))
+
+    def _take_token(self):
+        # Returns seconds to wait before the token is available (the token is reserved anyway)
+        def take(db):
+            now = time.time()
+            row = db.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + max(0, now - row[1]) * self.rate)
+            tokens -= 1
+            db.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)", (self.name, tokens, now))
+            return 0 if tokens >= 0 else -tokens / self.rate
+
+        return self._db.transaction(take)
+
+    def acquire(self):
+        """
+        Block until request can be sent. Call release() after the request.
+        """
+        wait = self._take_token()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Async version of acquire(). Call release() after the request.
+        """
+        wait = await asyncio.to_thread(self._take_token)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def release(self, overloaded = False):
+        """
+        Release request slot.
+
+        :param overloaded: (Optional) True if the server reported overload.
+        """
+        if overloaded:
+            self.overloads += 1
+
+    def cancel(self):
+        """
+        Release request slot of the request which was not sent. Reserved token is not returned.
+        """
+
+    def close(self):
+        """
+        Close the database connection of this process.
+        """
+        self._db.close()
@@ -0,0 +1,119 @@
+import asyncio
+import copy
+import threading
+
+# Read-only API methods: identical concurrent calls return the same result
+DEFAULT_COALESCE_METHODS = (
+    "getMe", "getInvoices", "getChecks", "getTransfers", "getBalance",
+    "getExchangeRates", "getCurrencies", "getStats",
+)
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error", "waiters", "task")
+
+    def __init__(self, task = None):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.task = task
+
+
+class SingleFlight:
+    """
+    Coalescing of identical concurrent read-only calls (single-flight).
+    While a request is in flight, the same calls from other threads or tasks wait for it
+    and get its result (each caller its own copy) or exception instead of sending their own request.
+    Pass an instance to pyCryptoPayAPI(single_flight=...) or AsyncCryptoPayAPI(single_flight=...).
+    """
+
+    def __init__(self, methods = DEFAULT_COALESCE_METHODS):
+        """
+        Create the SingleFlight instance.
+
+        :param methods: (Optional) API methods which may be coalesced. Default is DEFAULT_COALESCE_METHODS.
+        """
+        self.methods = frozenset(methods)
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(owner, method, params):
+        """
+        Non-API method
+        Key of the call. owner distinguishes clients with different tokens or API URLs sharing the instance.
+        """
+        return owner, method, tuple(sorted((key, str(value)) for key, value in params.items())) if params else ()
+
+    def call(self, key, func):
+        """
+        Call func() or wait for the in-flight call with the same key.
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self.shared += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+        # No new waiters after the flight is removed: the result is copied only if it was shared
+        return copy.deepcopy(flight.result) if flight.waiters else flight.result
+
+    async def call_async(self, key, func):
+        """
+        Async version of call(): func() returns coroutine.
+        """
+        # Tasks belong to the loop, so the same instance may be used from several loops
+        key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            self.calls += 1
+            flight = self._async_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._async_flights[key] = _Flight(asyncio.ensure_future(func()))
+                flight.task.add_done_callback(lambda done: self._finish_async(key, done))
+            else:
+                flight.waiters += 1
+                self.shared += 1
+        # Cancelling one waiter must not cancel the request shared with others
+        result = await asyncio.shield(flight.task)
+        # The flight is removed before waiters resume, so waiters count is final here
+        return copy.deepcopy(result) if not leader or flight.waiters else result
+
+    def _finish_async(self, key, task):
+        with self._lock:
+            self._async_flights.pop(key, None)
+        if not task.cancelled():
+            # Mark exception as retrieved if every waiter was cancelled
+            task.exception()
+
+    def stats(self):
+        """
+        Return dict of coalescing counters: calls and shared (calls served by another in-flight request).
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._flights) + len(self._async_flights),
+            }
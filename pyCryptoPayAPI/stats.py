@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from .classes import parse_datetime
+
+BUCKETS = {
+    "hour": timedelta(hours = 1),
+    "day": timedelta(days = 1),
+    "week": timedelta(weeks = 1),
+}
+
+# Monday, so weekly buckets start on Mondays; hourly and daily buckets are aligned to midnight UTC anyway
+_EPOCH = datetime(1970, 1, 5, tzinfo = timezone.utc)
+
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value.tzinfo is None:
+        # Naive dates are UTC
+        value = value.replace(tzinfo = timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _next_month(value):
+    return value.replace(year = value.year + value.month // 12, month = value.month % 12 + 1)
+
+
+def split_buckets(start_at, end_at, bucket):
+    """
+    Split time range into aligned buckets.
+
+    :param start_at: (DateTime/String) Range start. Naive dates are UTC.
+    :param end_at: (DateTime/String) Range end.
+    :param bucket: "hour", "day", "week", "month" or timedelta. Buckets are aligned to UTC calendar, so overlapping ranges share them.
+    :return: List of (bucket_start, bucket_end) datetimes covering the range.
+    """
+    start_at = _to_datetime(start_at)
+    end_at = _to_datetime(end_at)
+    buckets = []
+    if bucket == "month":
+        current = start_at.replace(day = 1, hour = 0, minute = 0, second = 0, microsecond = 0)
+        while current < end_at:
+            buckets.append((current, _next_month(current)))
+            current = buckets[-1][1]
+        return buckets
+    step = BUCKETS.get(bucket, bucket)
+    if not isinstance(step, timedelta) or step <= timedelta(0):
+        raise ValueError("Unknown bucket: {}".format(bucket))
+    current = _EPOCH + ((start_at - _EPOCH) // step) * step
+    while current < end_at:
+        buckets.append((current, current + step))
+        current += step
+    return buckets
+
+
+class StatsSeries:
+    """
+    Time series of app statistics built from getStats calls per bucket.
+    Missing buckets are requested in parallel. Buckets which are fully in the past never change,
+    so they are cached permanently (within max_entries); only the current bucket is requested again.
+    """
+
+    def __init__(self, client, max_workers = 8, settle = 300, max_entries = 100000):
+        """
+        Create the StatsSeries instance.
+
+        :param client: pyCryptoPayAPI instance.
+        :param max_workers: (Optional) Max number of parallel getStats requests. Default is 8.
+        :param settle: (Optional) Seconds after bucket end before it is treated as closed and cached. Default is 300.
+        :param max_entries: (Optional) Max number of cached buckets, least recently used are dropped. Default is 100000.
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.settle = timedelta(seconds = settle)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value
+
+    def _store(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last = False)
+
+    def get_series(self, start_at, end_at = None, bucket = "day"):
+        """
+        Non-API method
+        Return statistics for each bucket of the range.
+
+        :param start_at: (DateTime/String) Range start. Naive dates are UTC.
+        :param end_at: (DateTime/String) Optional. Range end. Defaults to now.
+        :param bucket: (Optional) "hour", "day", "week", "month" or timedelta. Default is "day".
+        :return: List of AppStats (or raw dicts, as returned by the client) in time order, one per bucket.
+        """
+        now = datetime.now(timezone.utc)
+        buckets = split_buckets(start_at, end_at if end_at is not None else now, bucket)
+        results = [None] * len(buckets)
+        missing = []
+        for index, (bucket_start, bucket_end) in enumerate(buckets):
+            value = self._cached((bucket_start, bucket_end))
+            if value is None:
+                missing.append(index)
+            else:
+                results[index] = value
+
+        def fetch(index):
+            bucket_start, bucket_end = buckets[index]
+            value = self.client.get_stats(start_at = bucket_start, end_at = bucket_end)
+            if bucket_end + self.settle <= now:
+                self._store((bucket_start, bucket_end), value)
+            return value
+
+        if len(missing) == 1:
+            results[missing[0]] = fetch(missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers = min(self.max_workers, len(missing))) as executor:
+                for index, value in zip(missing, executor.map(fetch, missing)):
+                    results[index] = value
+        return results
+
+    def clear(self):
+        """
+        Drop cached buckets.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """
+        Return dict of cache counters.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+            }
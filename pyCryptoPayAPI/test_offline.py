@@ -0,0 +1,908 @@
+import asyncio
+import csv
+import io
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import pytest
+import requests
+from pyCryptoPayAPI import (
+    pyCryptoPayAPI, pyCryptoPayException, AsyncCryptoPayAPI, MockCryptoPayServer,
+    RetryPolicy, TransferJournal, PayoutRunner, BalanceLedger, Exporter, LocalMirror,
+    WebhookHandler, sign_webhook, check_webhook_signature, SingleFlight, TTLCache, SharedTTLCache, RequestMetrics,
+    ClientPool, PaymentWatcher, check_params, ParamError, RateLimiter, CombinedRateLimiter,
+    ExchangeRateTable, Invoice, Balance, StatsSeries, split_buckets,
+)
+from pyCryptoPayAPI.json_backend import JSON_BACKENDS, DEFAULT_JSON_BACKEND, get_json_loads
+
+# Offline tests against MockCryptoPayServer: pytest pyCryptoPayAPI/test_offline.py
+
+
+@pytest.fixture
+def server():
+    with MockCryptoPayServer() as server:
+        yield server
+
+
+def make_client(server, **kwargs):
+    return pyCryptoPayAPI("test", result_as_class = True, api_url = server.url, **kwargs)
+
+
+# Connection pool and client lifecycle
+
+def test_client_reuses_connection(server):
+    with make_client(server) as client:
+        for _ in range(5):
+            client.get_me()
+        pools = client.session.get_adapter(server.url).poolmanager.pools
+        pool = pools[list(pools.keys())[0]]
+        assert (pool.num_connections, pool.num_requests) == (1, 5)
+    assert client.session is None
+    with pytest.raises(pyCryptoPayException) as error:
+        client.get_me()
+    assert error.value.code == -5
+
+
+def test_client_does_not_close_external_session(server):
+    session = requests.Session()
+    with make_client(server, session = session) as client:
+        client.get_me()
+    assert session.get(server.url + "getMe").json()["ok"]
+    session.close()
+
+
+def test_async_client_close(server):
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url) as client:
+            await client.get_me()
+            session = client.session
+        assert session.closed
+        with pytest.raises(pyCryptoPayException) as error:
+            await client.get_me()
+        assert error.value.code == -5
+
+    asyncio.run(run())
+
+
+# Pagination
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_iter_pages(server, prefetch):
+    client = make_client(server)
+    for index in range(25):
+        client.create_invoice("TON" if index % 2 else "USDT", index + 1)
+    requests_before = server.requests
+    invoices = list(client.iter_invoices(page_size = 10, prefetch = prefetch))
+    # Newest first, every invoice once, 3 pages (the last one short)
+    assert [invoice.invoice_id for invoice in invoices] == sorted(server.invoices, reverse = True)
+    assert server.requests - requests_before == 3
+    assert len(list(client.iter_invoices(asset = "TON", page_size = 5, prefetch = prefetch))) == 12
+
+
+def test_iter_pages_lazy(server):
+    client = make_client(server)
+    for index in range(30):
+        client.create_invoice("TON", index + 1)
+    requests_before = server.requests
+    iterator = client.iter_invoices(page_size = 10)
+    first = [next(iterator) for _ in range(10)]
+    assert len(first) == 10
+    assert server.requests - requests_before == 1
+
+
+def test_iter_transfers_and_checks(server):
+    client = make_client(server)
+    for index in range(3):
+        client.transfer(1, "TON", "1", "spend-{}".format(index))
+        client.create_check("USDT", "1")
+    assert [transfer.spend_id for transfer in client.iter_transfers(page_size = 2)] == ["spend-2", "spend-1", "spend-0"]
+    assert len(list(client.iter_checks(page_size = 3, prefetch = True))) == 3
+
+
+def test_async_iter_pages(server):
+    client = make_client(server)
+    for index in range(12):
+        client.create_invoice("TON", index + 1)
+
+    async def run(prefetch):
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url) as async_client:
+            return [invoice.invoice_id async for invoice in async_client.iter_invoices(page_size = 5, prefetch = prefetch)]
+
+    assert asyncio.run(run(False)) == asyncio.run(run(True)) == sorted(server.invoices, reverse = True)
+
+
+# Lookup by IDs
+
+def test_get_by_ids_chunks(server):
+    client = make_client(server)
+    for index in range(25):
+        client.create_invoice("TON", index + 1)
+    ids = sorted(server.invoices)
+    requests_before = server.requests
+    # Duplicates are dropped, unknown IDs are simply absent
+    found = client.get_invoices_by_ids(ids + ids[:5] + [999999], chunk_size = 10)
+    assert sorted(found) == ids
+    assert all(found[invoice_id].invoice_id == invoice_id for invoice_id in ids)
+    assert server.requests - requests_before == 3
+    assert client.get_invoices_by_ids([]) == {}
+    assert server.requests - requests_before == 3
+
+
+def test_get_checks_and_transfers_by_ids(server):
+    client = make_client(server)
+    check_ids = [client.create_check("USDT", "1").check_id for _ in range(3)]
+    transfer_ids = [client.transfer(1, "TON", "1", "spend-{}".format(index)).transfer_id for index in range(3)]
+    assert sorted(client.get_checks_by_ids(check_ids, chunk_size = 2)) == sorted(check_ids)
+    assert sorted(client.get_transfers_by_ids(transfer_ids[:2])) == sorted(transfer_ids[:2])
+
+
+def test_async_get_by_ids_chunks(server):
+    client = make_client(server)
+    for index in range(12):
+        client.create_invoice("TON", index + 1)
+    ids = sorted(server.invoices)
+
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url) as async_client:
+            return await async_client.get_invoices_by_ids(ids + [999999], chunk_size = 5)
+
+    requests_before = server.requests
+    assert sorted(asyncio.run(run())) == ids
+    assert server.requests - requests_before == 3
+
+
+# API classes
+
+def test_class_slots_and_unknown_fields():
+    invoice = Invoice({"invoice_id": 1, "status": "active", "new_field": "x"})
+    # Declared fields live in slots, only unknown ones go to __dict__
+    assert vars(invoice) == {"new_field": "x"}
+    assert invoice.new_field == "x"
+    assert invoice.paid_at is None
+    assert invoice.to_dict()["invoice_id"] == 1
+    assert invoice.to_dict()["new_field"] == "x"
+    assert "paid_at" in invoice.to_dict()
+    with pytest.raises(AttributeError):
+        invoice.missing_field
+    invoice.status = "paid"
+    assert invoice.status == "paid"
+    assert "status=paid" in repr(invoice)
+
+
+def test_class_without_unknown_fields():
+    balance = Balance({"currency_code": "TON", "available": "1", "onhold": "0"})
+    assert vars(balance) == {}
+    assert balance.to_dict() == {"currency_code": "TON", "available": "1", "onhold": "0"}
+
+
+def test_typed_fields():
+    invoice = Invoice({"amount": "1.50", "created_at": "2024-01-02T03:04:05.000Z", "paid_at": None})
+    assert invoice.amount_decimal == Decimal("1.50")
+    assert invoice.amount_decimal is invoice.amount_decimal
+    assert invoice.created_at_datetime == datetime(2024, 1, 2, 3, 4, 5, tzinfo = timezone.utc)
+    assert invoice.created_at_datetime.tzinfo is not None
+    assert invoice.paid_at_datetime is None
+    assert invoice.fee_amount_decimal is None
+    # Re-parsed when the raw field changes
+    invoice.amount = "2"
+    assert invoice.amount_decimal == Decimal("2")
+    invoice.paid_at = "2024-01-02T04:00:00+00:00"
+    assert invoice.paid_at_datetime - invoice.created_at_datetime == timedelta(minutes = 55, seconds = 55)
+    # Raw fields are kept as received
+    assert invoice.to_dict()["amount"] == "2"
+
+
+def test_typed_fields_from_client(server):
+    balance = [item for item in make_client(server).get_balance() if item.currency_code == "TON"][0]
+    assert balance.available_decimal == Decimal(balance.available)
+
+
+# JSON backend
+
+def test_json_backend_selection():
+    assert get_json_loads("json") is json.loads
+    assert get_json_loads() is JSON_BACKENDS[DEFAULT_JSON_BACKEND]
+    assert get_json_loads("json")(b'{"ok": true}') == {"ok": True}
+    with pytest.raises(ValueError):
+        get_json_loads("simplejson")
+
+
+def test_json_backend_orjson():
+    orjson = pytest.importorskip("orjson")
+    assert DEFAULT_JSON_BACKEND == "orjson"
+    assert get_json_loads("orjson") is orjson.loads
+
+
+def test_json_backend_callable(server):
+    calls = []
+
+    def loads(content):
+        calls.append(content)
+        return json.loads(content)
+
+    client = make_client(server, json_backend = loads)
+    assert client.json_loads is loads
+    client.get_me()
+    assert len(calls) == 1
+
+
+# Stats series
+
+def test_split_buckets_alignment():
+    utc = timezone.utc
+    assert split_buckets("2024-01-01T10:30:00Z", "2024-01-01T12:00:00Z", "hour") == [
+        (datetime(2024, 1, 1, 10, tzinfo = utc), datetime(2024, 1, 1, 11, tzinfo = utc)),
+        (datetime(2024, 1, 1, 11, tzinfo = utc), datetime(2024, 1, 1, 12, tzinfo = utc)),
+    ]
+    # Naive dates are UTC
+    days = split_buckets(datetime(2024, 1, 1, 10), datetime(2024, 1, 3, 1), "day")
+    assert [start.day for start, end in days] == [1, 2, 3]
+    assert days[0][0] == datetime(2024, 1, 1, tzinfo = utc)
+    # Weeks start on Monday (2024-01-03 is a Wednesday)
+    weeks = split_buckets("2024-01-03T00:00:00Z", "2024-01-10T00:00:00Z", "week")
+    assert [start for start, end in weeks] == [datetime(2024, 1, 1, tzinfo = utc), datetime(2024, 1, 8, tzinfo = utc)]
+    assert all(start.weekday() == 0 for start, end in weeks)
+    months = split_buckets("2023-11-15T00:00:00Z", "2024-01-02T00:00:00Z", "month")
+    assert [(start.year, start.month) for start, end in months] == [(2023, 11), (2023, 12), (2024, 1)]
+    assert months[1][1] == datetime(2024, 1, 1, tzinfo = utc)
+    assert len(split_buckets("2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z", timedelta(minutes = 15))) == 4
+    with pytest.raises(ValueError):
+        split_buckets("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", "year")
+    with pytest.raises(ValueError):
+        split_buckets("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", timedelta(0))
+
+
+def test_stats_series_caches_past_buckets(server):
+    client = make_client(server)
+    series = StatsSeries(client)
+    requests_before = server.requests
+    result = series.get_series("2024-01-01T00:00:00Z", "2024-01-08T00:00:00Z")
+    assert len(result) == 7
+    assert result[0].start_at_datetime == datetime(2024, 1, 1, tzinfo = timezone.utc)
+    assert server.requests - requests_before == 7
+    # Same past range again: all from cache
+    assert series.get_series("2024-01-01T00:00:00Z", "2024-01-08T00:00:00Z") == result
+    assert server.requests - requests_before == 7
+    # Overlapping range reuses the shared buckets
+    series.get_series("2024-01-05T12:00:00Z", "2024-01-09T00:00:00Z")
+    assert server.requests - requests_before == 8
+    assert series.stats() == {"hits": 10, "misses": 8, "size": 8}
+
+
+def test_stats_series_refetches_current_bucket(server):
+    series = StatsSeries(make_client(server))
+    start_at = datetime.now(timezone.utc) - timedelta(hours = 1)
+    requests_before = server.requests
+    series.get_series(start_at, bucket = "hour")
+    series.get_series(start_at, bucket = "hour")
+    buckets = len(split_buckets(start_at, datetime.now(timezone.utc), "hour"))
+    # Only the closed bucket (if settled) is cached, the current one is requested each time
+    assert server.requests - requests_before >= buckets + 1
+    series.clear()
+    assert series.stats()["size"] == 0
+
+
+# Exchange rate table
+
+def test_rate_table_inverse_and_cross():
+    table = ExchangeRateTable([
+        {"source": "TON", "target": "USD", "rate": "2", "is_valid": True},
+        {"source": "BTC", "target": "USD", "rate": "40000", "is_valid": True},
+        {"source": "USD", "target": "EUR", "rate": "0.5", "is_valid": True},
+        {"source": "ETH", "target": "USD", "rate": "3000", "is_valid": False},
+    ])
+    assert len(table) == 3
+    assert table.rate("TON", "TON") == 1
+    assert table.rate("TON", "USD") == Decimal("2")
+    # Inverse of a direct pair
+    assert table.rate("USD", "TON") == Decimal("0.5")
+    # Cross rates via the pivot
+    assert table.rate("BTC", "TON") == Decimal("20000")
+    assert table.rate("TON", "EUR") == Decimal("1")
+    assert table.convert("3", "BTC", "EUR") == Decimal("60000")
+    assert table.convert_many([1, "2.5"], "TON", "USD") == [Decimal("2"), Decimal("5.0")]
+    # Stale rates are skipped
+    assert ("ETH", "USD") not in table
+    with pytest.raises(KeyError):
+        table.rate("ETH", "USD")
+
+
+def test_rate_table_keeps_direct_rate():
+    table = ExchangeRateTable([
+        {"source": "TON", "target": "USD", "rate": "2", "is_valid": True},
+        {"source": "USD", "target": "TON", "rate": "0.4", "is_valid": True},
+    ])
+    assert table.rate("TON", "USD") == Decimal("2")
+    assert table.rate("USD", "TON") == Decimal("0.4")
+
+
+def test_rate_table_from_client(server):
+    table = make_client(server).get_exchange_rate_table()
+    assert ("TON", "USD") in table
+    assert table.rate("USD", "TON") == 1 / table.rate("TON", "USD")
+
+
+# Retries and transfer journal
+
+def test_retry_temporary_errors(server):
+    server.error_rate = 1
+    server.error_status = 502
+    client = make_client(server, retry_policy = RetryPolicy(max_attempts = 3, base_delay = 0, jitter = False))
+    with pytest.raises(pyCryptoPayException) as error:
+        client.get_me()
+    assert error.value.http_status == 502
+    assert server.requests == 3
+    assert client.retry_policy.retries == 2
+
+
+def test_retry_skips_non_idempotent_methods(server):
+    server.error_rate = 1
+    client = make_client(server, retry_policy = RetryPolicy(base_delay = 0))
+    with pytest.raises(pyCryptoPayException):
+        client.create_invoice("TON", 1)
+    assert server.requests == 1
+
+
+def test_journal_does_not_resend_done_transfer(server):
+    client = make_client(server, transfer_journal = TransferJournal())
+    first = client.transfer(1, "TON", "2", "spend-1")
+    requests = server.requests
+    second = client.transfer(1, "TON", "2", "spend-1")
+    assert second.transfer_id == first.transfer_id
+    assert server.requests == requests
+    assert len(server.transfers) == 1
+
+
+def test_journal_looks_up_interrupted_transfer(server):
+    journal = TransferJournal()
+    client = make_client(server, transfer_journal = journal)
+    sent = client.transfer(1, "TON", "2", "spend-1")
+    # As if the process crashed after sending
+    journal._set("spend-1", journal.PENDING)
+    assert client.transfer(1, "TON", "2", "spend-1").transfer_id == sent.transfer_id
+    assert len(server.transfers) == 1
+    assert journal.get("spend-1")[0] == journal.DONE
+
+
+def test_journal_marks_rejected_transfer_failed(server):
+    journal = TransferJournal()
+    client = make_client(server, transfer_journal = journal)
+    with pytest.raises(pyCryptoPayException) as error:
+        client.transfer(1, "TON", "100000000", "spend-1")
+    assert error.value.name == "INSUFFICIENT_FUNDS"
+    assert journal.get("spend-1")[0] == journal.FAILED
+
+
+def test_async_journal(server):
+    journal = TransferJournal()
+
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url, transfer_journal = journal) as client:
+            first = await client.transfer(1, "TON", "2", "spend-1")
+            second = await client.transfer(1, "TON", "2", "spend-1")
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert first.transfer_id == second.transfer_id
+    assert len(server.transfers) == 1
+
+
+# Payouts
+
+def test_payouts_report(server, tmp_path):
+    report = str(tmp_path / "report.csv")
+    rows = [(user_id, "TON", "1.5") for user_id in range(1, 21)]
+    summary = PayoutRunner(make_client(server), "run-1", max_workers = 4).run(rows, report = report)
+    assert summary == {"done": 20, "failed": 0}
+    with open(report, newline = "") as report_file:
+        assert sorted(int(row["user_id"]) for row in csv.DictReader(report_file)) == list(range(1, 21))
+    assert Decimal(server.balances["TON"]) == Decimal(1000000) - 30
+
+
+def test_payouts_check_balance_before_sending(server):
+    server.balances["TON"] = "5"
+    with pytest.raises(pyCryptoPayException) as error:
+        PayoutRunner(make_client(server), "run-1").run([(1, "TON", 3), (2, "TON", 3)])
+    assert error.value.code == -8
+    assert not server.transfers
+
+
+def test_payouts_resume_with_journal(server):
+    server.balances["TON"] = "10"
+    client = make_client(server, transfer_journal = TransferJournal())
+    rows = [(user_id, "TON", 2) for user_id in range(1, 5)]
+    assert PayoutRunner(client, "run-1").run(rows[:3]) == {"done": 3, "failed": 0}
+    # 2 TON left: enough for the row not sent yet only
+    assert PayoutRunner(client, "run-1").run(rows) == {"done": 4, "failed": 0}
+    assert len(server.transfers) == 4
+    assert Decimal(server.balances["TON"]) == 2
+
+
+def test_payouts_resume_without_journal(server):
+    server.balances["TON"] = "10"
+    client = make_client(server)
+    rows = [(user_id, "TON", 2) for user_id in range(1, 5)]
+    PayoutRunner(client, "run-1").run(rows[:3])
+    with pytest.raises(pyCryptoPayException):
+        PayoutRunner(client, "run-1").run(rows)
+    # Rows paid by the first run are found via getTransfers, not counted as needed balance
+    summary = PayoutRunner(client, "run-1", resume = True).run(rows)
+    assert summary["done"] == 1
+    assert len(server.transfers) == 4
+
+
+def test_payouts_short_balance_fails_with_one_request(server):
+    server.balances["TON"] = "10"
+    rows = [(user_id, "TON", 1) for user_id in range(1, 501)]
+    with pytest.raises(pyCryptoPayException) as error:
+        PayoutRunner(make_client(server), "run-1").run(rows)
+    assert error.value.code == -8
+    assert server.requests == 1
+
+
+# Strict params
+
+def test_strict_params_rejects_locally(server):
+    client = make_client(server, strict_params = True)
+    with pytest.raises(pyCryptoPayException) as error:
+        client.get_invoices(count = 5000)
+    assert error.value.name == "COUNT_INVALID"
+    with pytest.raises(pyCryptoPayException) as error:
+        client.create_invoice("TON", 1, swap_to = "BNB")
+    assert error.value.name == "SWAP_TO_INVALID"
+    assert server.requests == 0
+
+
+def test_strict_params_serializes(server):
+    client = make_client(server, strict_params = True)
+    invoice = client.create_invoice("TON", 1, allow_comments = False, swap_to = "SOL")
+    assert invoice.allow_comments is False
+    assert invoice.swap_to == "SOL"
+
+
+def test_check_params():
+    assert check_params("transfer", {"user_id": "1", "asset": "TON", "amount": 1.5, "spend_id": "x"})["amount"] == "1.5"
+    with pytest.raises(ParamError):
+        check_params("transfer", {"user_id": 1, "asset": "TON", "amount": 1})
+    with pytest.raises(ParamError):
+        check_params("createInvoice", {"asset": "TON", "amount": 1, "unknown": 1})
+
+
+# Balance ledger
+
+def test_ledger_tracks_balance_locally(server):
+    client = make_client(server)
+    ledger = BalanceLedger(client, reconcile_interval = None)
+    assert ledger.available("TON") == 1000000
+    requests = server.requests
+    ledger.transfer(1, "TON", "1.5", "spend-1")
+    check = ledger.create_check("TON", "10")
+    invoice = client.create_invoice("TON", "7")
+    paid = server.pay_invoice(invoice.invoice_id, fee_amount = "0.07")
+    ledger.invoice_paid(paid)
+    ledger.invoice_paid(paid)
+    ledger.delete_check(check.check_id)
+    assert ledger.available("TON") == Decimal("1000000") - Decimal("1.5") + Decimal("6.93")
+    # Lookups do not call getBalance
+    assert server.requests == requests + 4
+    assert ledger.reconcile() == {}
+
+
+def test_ledger_counts_journaled_transfer_once(server):
+    client = make_client(server, transfer_journal = TransferJournal())
+    ledger = BalanceLedger(client, reconcile_interval = None)
+    ledger.reconcile()
+    ledger.transfer(1, "TON", "5", "spend-1")
+    ledger.transfer(1, "TON", "5", "spend-1")
+    transfer = client.transfer(1, "TON", "1", "spend-2")
+    ledger.transfer_done(transfer)
+    ledger.transfer_done(transfer)
+    assert ledger.available("TON") == Decimal(server.balances["TON"])
+    assert ledger.reconcile() == {}
+
+
+def test_ledger_reconcile_not_starved(server):
+    server.latency = 0.02
+    ledger = BalanceLedger(make_client(server), reconcile_interval = None)
+    ledger.reconcile()
+    stop = threading.Event()
+
+    def load(worker):
+        index = 0
+        while not stop.is_set():
+            ledger.transfer(1, "TON", "0.001", "{}-{}".format(worker, index))
+            index += 1
+
+    threads = [threading.Thread(target = load, args = (worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(0.1)
+        started = time.monotonic()
+        ledger.reconcile()
+        assert time.monotonic() - started < 2
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert ledger.reconcile() == {}
+
+
+# Export
+
+def test_export_resume(server, tmp_path):
+    client = make_client(server)
+    for index in range(35):
+        client.create_invoice("TON", index + 1)
+    path = str(tmp_path / "invoices.csv")
+    get_invoices = client.get_invoices
+    calls = []
+
+    def failing_get_invoices(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 3:
+            raise pyCryptoPayException(-3, "UNKNOWN", "Interrupted")
+        return get_invoices(**kwargs)
+
+    client.get_invoices = failing_get_invoices
+    with pytest.raises(pyCryptoPayException):
+        Exporter(client, page_size = 10).export("invoices", path)
+    client.get_invoices = get_invoices
+    result = Exporter(client, page_size = 10).export("invoices", path)
+    assert result == {"rows": 35, "resumed": True}
+    with open(path, newline = "") as export_file:
+        ids = [int(row["invoice_id"]) for row in csv.DictReader(export_file)]
+    assert sorted(ids) == sorted(server.invoices)
+
+
+# Local mirror
+
+def test_mirror_incremental_sync(server):
+    client = make_client(server)
+    invoices = [client.create_invoice("TON", index + 1) for index in range(5)]
+    client.transfer(1, "TON", "1", "spend-1")
+    mirror = LocalMirror(client, page_size = 2)
+    first = mirror.sync()
+    assert first["invoices"]["new"] == 5
+    assert first["transfers"]["new"] == 1
+    server.pay_invoice(invoices[0].invoice_id)
+    client.create_invoice("TON", 10)
+    second = mirror.sync(("invoices",))
+    assert second["invoices"]["new"] == 1
+    assert second["invoices"]["updated"] == 1
+    assert [invoice.invoice_id for invoice in mirror.invoices(status = "paid")] == [invoices[0].invoice_id]
+    assert len(mirror.invoices()) == 6
+
+
+# Webhooks
+
+def test_webhook_signature_and_dedupe():
+    received = []
+    handler = WebhookHandler("test", workers = 2)
+    handler.add_handler(received.append)
+    body = json.dumps({"update_id": 1, "update_type": "invoice_paid", "request_date": "2024-01-01T00:00:00.000Z",
+                       "payload": {"invoice_id": 5, "status": "paid"}})
+    with handler:
+        with pytest.raises(pyCryptoPayException) as error:
+            handler.process(body, sign_webhook("other", body))
+        assert error.value.code == -6
+        assert handler.process(body, sign_webhook("test", body)) is True
+        assert handler.process(body, sign_webhook("test", body)) is False
+        handler.join()
+    assert [update.payload.invoice_id for update in received] == [5]
+    assert handler.duplicates == 1
+
+
+# Request coalescing, cache, metrics
+
+def test_single_flight(server):
+    server.latency = 0.2
+    client = make_client(server, single_flight = SingleFlight())
+    threads = [threading.Thread(target = client.get_balance) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.requests == 1
+    assert client.single_flight.stats()["shared"] == 7
+
+
+def test_cache(server):
+    client = make_client(server, cache = TTLCache())
+    for _ in range(3):
+        client.get_exchange_rates()
+    assert server.requests == 1
+    assert client.cache.stats()["hits"] == 2
+
+
+def test_cache_returns_copies(server):
+    client = pyCryptoPayAPI("test", result_as_class = False, api_url = server.url, cache = TTLCache())
+    rates = client.get_exchange_rates()
+    rates.clear()
+    cached = client.get_exchange_rates()
+    assert cached
+    cached[0]["rate"] = "0"
+    assert client.get_exchange_rates()[0]["rate"] != "0"
+    assert server.requests == 1
+
+
+def test_single_flight_returns_copies(server):
+    server.latency = 0.2
+    client = pyCryptoPayAPI("test", result_as_class = False, api_url = server.url, single_flight = SingleFlight())
+    results = []
+
+    def call():
+        balances = client.get_balance()
+        results.append(balances)
+        balances.clear()
+
+    threads = [threading.Thread(target = call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.requests == 1
+    assert len(set(id(result) for result in results)) == 4
+
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = False, api_url = server.url, single_flight = SingleFlight()) as async_client:
+            return await asyncio.gather(*[async_client.get_balance() for _ in range(4)])
+
+    async_results = asyncio.run(run())
+    assert server.requests == 2
+    assert len(set(id(result) for result in async_results)) == 4 and all(async_results)
+
+
+def test_async_cache(server):
+    cache = TTLCache()
+
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url, cache = cache) as client:
+            for _ in range(3):
+                await client.get_currencies()
+
+    asyncio.run(run())
+    assert server.requests == 1
+    assert cache.stats()["hits"] == 2
+
+
+def test_shared_cache(server, tmp_path):
+    path = str(tmp_path / "shared.db")
+    clients = [make_client(server, cache = SharedTTLCache(path)) for _ in range(2)]
+    for client in clients:
+        client.get_currencies()
+    assert server.requests == 1
+
+
+def test_shared_cache_async_does_not_block_loop(server, tmp_path):
+    path = str(tmp_path / "shared.db")
+    cache = SharedTTLCache(path)
+    # Another process holds the database lock for a while
+    other = sqlite3.connect(path, isolation_level = None, check_same_thread = False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, other.execute, ("COMMIT",)).start()
+    ticks = []
+
+    async def ticker():
+        for _ in range(10):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url, cache = cache) as client:
+            tick_task = asyncio.ensure_future(ticker())
+            await client.get_currencies()
+            await tick_task
+
+    started = time.monotonic()
+    asyncio.run(run())
+    other.close()
+    assert len([tick for tick in ticks if tick - started < 0.25]) >= 5
+    assert server.requests == 1
+
+
+def test_request_metrics(server):
+    metrics = RequestMetrics()
+    server.method_errors = {"getBalance": (400, "TEST_ERROR")}
+    client = make_client(server, request_hooks = [metrics])
+    client.get_me()
+    with pytest.raises(pyCryptoPayException):
+        client.get_balance()
+    snapshot = metrics.snapshot()
+    assert snapshot["getMe"]["requests"] == 1
+    assert snapshot["getBalance"]["error_codes"] == {400: 1}
+    assert "cryptopay_requests_total" in metrics.prometheus_text()
+
+
+# Client pool and payment watcher
+
+def test_client_pool(server):
+    with ClientPool(result_as_class = True, api_url = server.url) as pool:
+        balances = pool.get_balance_all(["token-1", "token-2"])
+    assert sorted(balances) == ["token-1", "token-2"]
+    assert server.requests == 2
+
+
+def test_payment_watcher(server):
+    client = make_client(server)
+    paid = []
+    expired = []
+    watcher = PaymentWatcher(client, on_paid = paid.append, on_expired = expired.append)
+    first = client.create_invoice("TON", 1)
+    second = client.create_invoice("TON", 1)
+    watcher.watch(first.invoice_id)
+    watcher.watch(second.invoice_id)
+    watcher.poll(force = True)
+    assert not paid and not expired
+    server.pay_invoice(first.invoice_id)
+    server.expire_invoice(second.invoice_id)
+    watcher.poll(force = True)
+    assert [invoice.invoice_id for invoice in paid] == [first.invoice_id]
+    assert [invoice.invoice_id for invoice in expired] == [second.invoice_id]
+    assert not watcher.watched()
+
+
+def test_payment_watcher_batches_polls(server):
+    client = make_client(server)
+    invoices = [client.create_invoice("TON", 1) for _ in range(50)]
+    requests = server.requests
+    with PaymentWatcher(client, min_interval = 0.2, max_interval = 0.2) as watcher:
+        # Invoices watched at different moments are polled together
+        for invoice in invoices:
+            watcher.watch(invoice.invoice_id)
+            time.sleep(0.004)
+        time.sleep(1)
+    # About one request per tick (0.1 s), not one per invoice
+    assert server.requests - requests <= 16
+    assert watcher.stats()["requests"] == server.requests - requests
+
+
+# Async client
+
+def test_async_amounts_sent_as_given(server):
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url) as client:
+            return [await client.create_invoice("TON", amount) for amount in (Decimal("2.75"), Decimal("0.5"), 1.25, 3)]
+
+    assert [invoice.amount for invoice in asyncio.run(run())] == ["2.75", "0.5", "1.25", "3"]
+
+
+# Bulk helpers
+
+def test_create_invoices_bulk_reports_errors_per_item(server):
+    client = make_client(server)
+    invoices = [{"asset": "TON", "amount": index + 1} for index in range(10)]
+    invoices.insert(5, {"asset": "TON", "bogus": 1})
+    results = list(client.create_invoices_bulk(invoices, max_workers = 3))
+    assert len(results) == 11
+    failed = [(params, error) for params, invoice, error in results if error is not None]
+    assert len(failed) == 1 and failed[0][0] == {"asset": "TON", "bogus": 1}
+    assert isinstance(failed[0][1], TypeError)
+    assert sorted(int(invoice.amount) for params, invoice, error in results if invoice is not None) == list(range(1, 11))
+
+
+def test_delete_bulk(server):
+    client = make_client(server)
+    invoice_ids = [client.create_invoice("TON", 1).invoice_id for _ in range(5)]
+    check_ids = [client.create_check("TON", 1).check_id for _ in range(3)]
+    results = {invoice_id: error for invoice_id, result, error in client.delete_invoices_bulk(invoice_ids + [999999])}
+    assert all(results[invoice_id] is None for invoice_id in invoice_ids)
+    assert results[999999].name == "INVOICE_NOT_FOUND"
+    assert not server.invoices
+    assert all(error is None for check_id, result, error in client.delete_checks_bulk(check_ids))
+    assert not server.checks
+
+
+def test_async_bulk(server):
+    async def run():
+        async with AsyncCryptoPayAPI("test", result_as_class = True, api_url = server.url) as client:
+            created = [item async for item in client.create_invoices_bulk(
+                [{"asset": "TON", "amount": 1}, {"asset": "TON", "bogus": 1}, {"asset": "TON", "amount": 2}], max_workers = 2)]
+            deleted = [item async for item in client.delete_invoices_bulk(list(server.invoices))]
+            return created, deleted
+
+    created, deleted = asyncio.run(run())
+    assert sorted(type(error).__name__ for params, invoice, error in created) == ["NoneType", "NoneType", "TypeError"]
+    assert len(deleted) == 2 and all(error is None for invoice_id, result, error in deleted)
+    assert not server.invoices
+
+
+# Rate limiter
+
+def test_rate_limiter_rate():
+    limiter = RateLimiter(rate = 20, burst = 1, max_concurrency = None)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release()
+    assert time.monotonic() - started >= 0.19
+
+
+def test_rate_limiter_concurrency():
+    limiter = RateLimiter(rate = None, max_concurrency = 2, adaptive = False)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target = acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.stats()["in_flight"] == 2
+
+
+def test_rate_limiter_decreases_once_per_window():
+    limiter = RateLimiter(rate = None, max_concurrency = 32)
+    for _ in range(32):
+        limiter.acquire()
+    for _ in range(32):
+        limiter.release(overloaded = True)
+    assert limiter.stats() == {"concurrency": 16, "in_flight": 0, "overloads": 32}
+    # Next overload after the window decreases again, successes grow the limit back
+    limiter.acquire()
+    limiter.release(overloaded = True)
+    assert limiter.concurrency == 8
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.concurrency == 9
+
+
+def test_rate_limiter_cancelled_acquire_releases_slot():
+    limiter = RateLimiter(rate = 1, burst = 1, max_concurrency = 4)
+
+    async def run():
+        await limiter.acquire_async()
+        limiter.release()
+        # The next token is due in 1 second
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire_async(), 0.05)
+
+    asyncio.run(run())
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_combined_rate_limiter_cancelled_acquire_releases_slots():
+    token_limiter = RateLimiter(rate = None, max_concurrency = 4)
+    global_limiter = RateLimiter(rate = None, max_concurrency = 1, adaptive = False)
+    global_limiter.acquire()
+    limiter = CombinedRateLimiter(token_limiter, global_limiter)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire_async(), 0.05)
+
+    asyncio.run(run())
+    assert token_limiter.stats()["in_flight"] == 0
+    assert global_limiter.stats()["in_flight"] == 1
+
+
+def test_rate_limiter_with_client(server):
+    limiter = RateLimiter(rate = None, max_concurrency = 2)
+    client = make_client(server, rate_limiter = limiter)
+    assert all(error is None for invoice_id, result, error in client.delete_invoices_bulk(
+        [client.create_invoice("TON", 1).invoice_id for _ in range(6)], max_workers = 4))
+    assert limiter.stats() == {"concurrency": 2, "in_flight": 0, "overloads": 0}
+
+
+def test_webhook_non_ascii_signature():
+    body = b'{"update_id": 1}'
+    assert check_webhook_signature("test", body, "\u00e9" * 64) is False
+    handler = WebhookHandler("test")
+    with pytest.raises(pyCryptoPayException) as error:
+        handler.process(body, "\u044f" * 64)
+    assert error.value.code == -6
+    statuses = []
+    environ = {"REQUEST_METHOD": "POST", "CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body),
+               "HTTP_CRYPTO_PAY_API_SIGNATURE": "\u00e9" * 64}
+    handler.wsgi_app(environ, lambda status, headers: statuses.append(status))
+    assert statuses == ["401 Unauthorized"]
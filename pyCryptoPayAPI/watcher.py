@@ -0,0 +1,214 @@
+import math
+import threading
+import time
+from concurrent.futures import Future
+from .api import MAX_PAGE_SIZE, pyCryptoPayException
+
+FINAL_STATUSES = ("paid", "expired")
+
+
+class _Watch:
+    __slots__ = ("invoice_id", "added_at", "next_poll", "future", "on_paid", "on_expired")
+
+    def __init__(self, invoice_id, added_at, next_poll, on_paid, on_expired):
+        self.invoice_id = invoice_id
+        self.added_at = added_at
+        self.next_poll = next_poll
+        self.future = Future()
+        self.on_paid = on_paid
+        self.on_expired = on_expired
+
+
+class PaymentWatcher:
+    """
+    Watches any number of pending invoices with batched getInvoices calls from one background thread.
+    Fresh invoices are polled every min_interval seconds, the interval grows with invoice age up to max_interval.
+    Invoices are dropped once paid or expired: callbacks are called and futures resolved with the invoice.
+    """
+
+    def __init__(self, client, min_interval = 2, max_interval = 60, slowdown = 0.1, batch_size = MAX_PAGE_SIZE, max_workers = 4, on_paid = None, on_expired = None, print_errors = False, tick = None):
+        """
+        Create the PaymentWatcher instance.
+
+        :param client: pyCryptoPayAPI instance.
+        :param min_interval: (Optional) Poll interval of fresh invoices in seconds. Default is 2.
+        :param max_interval: (Optional) Max poll interval in seconds. Default is 60.
+        :param slowdown: (Optional) Poll interval grows by this many seconds per second of invoice age. Default is 0.1 (1 minute interval at 10 minutes).
+        :param batch_size: (Optional) Number of invoice IDs per getInvoices request, 1-1000. Default is 1000.
+        :param max_workers: (Optional) Max number of parallel requests when more than batch_size invoices are due. Default is 4.
+        :param on_paid: (Optional) Default callback(invoice) for paid invoices.
+        :param on_expired: (Optional) Default callback(invoice) for expired invoices.
+        :param print_errors: (Optional) Print request and callback exceptions
+        :param tick: (Optional) Poll times are rounded up to multiples of tick seconds, so invoices watched at different moments are polled in one request. Default is min_interval / 2.
+        """
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slowdown = slowdown
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.on_paid = on_paid
+        self.on_expired = on_expired
+        self.print_errors = print_errors
+        self.tick = tick if tick is not None else min_interval / 2
+        self.polls = 0
+        self.requests = 0
+        self.errors = 0
+        self._watches = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def watch(self, invoice_id, on_paid = None, on_expired = None):
+        """
+        Start watching the invoice.
+
+        :param invoice_id: Invoice ID
+        :param on_paid: (Optional) Callback(invoice) called when the invoice is paid. Defaults to the watcher on_paid.
+        :param on_expired: (Optional) Callback(invoice) called when the invoice expires. Defaults to the watcher on_expired.
+        :return: concurrent.futures.Future resolved with the paid or expired invoice, or with None if the invoice
+            was deleted or unwatched. Use asyncio.wrap_future() to await it.
+        """
+        invoice_id = int(invoice_id)
+        with self._condition:
+            watch = self._watches.get(invoice_id)
+            if watch is None:
+                now = time.monotonic()
+                watch = self._watches[invoice_id] = _Watch(invoice_id, now, self._align(now), on_paid, on_expired)
+                self._condition.notify_all()
+            return watch.future
+
+    def unwatch(self, invoice_id):
+        """
+        Stop watching the invoice. Its future is resolved with None.
+        """
+        with self._condition:
+            watch = self._watches.pop(int(invoice_id), None)
+        if watch is not None:
+            watch.future.set_result(None)
+
+    def watched(self):
+        """
+        Return list of watched invoice IDs.
+        """
+        with self._condition:
+            return list(self._watches)
+
+    def _align(self, moment):
+        # Shared grid of poll times: watches due at the same tick go in one batch
+        if not self.tick:
+            return moment
+        return math.ceil(moment / self.tick) * self.tick
+
+    def _interval(self, watch, now):
+        return min(self.max_interval, max(self.min_interval, (now - watch.added_at) * self.slowdown))
+
+    def poll(self, force = False):
+        """
+        Poll invoices which are due (all of them if force) once.
+        Called by the background thread, may be used directly instead of start().
+
+        :param force: (Optional) Poll all watched invoices regardless of their interval. Default is False.
+        :return: Number of finished (paid, expired or deleted) invoices.
+        """
+        now = time.monotonic()
+        with self._condition:
+            due = [watch for watch in self._watches.values() if force or watch.next_poll <= now]
+            for watch in due:
+                watch.next_poll = self._align(now + self._interval(watch, now))
+        if not due:
+            return 0
+        self.polls += 1
+        self.requests += (len(due) + self.batch_size - 1) // self.batch_size
+        invoices = self.client.get_invoices_by_ids([watch.invoice_id for watch in due], chunk_size = self.batch_size, max_workers = self.max_workers)
+        finished = 0
+        for watch in due:
+            invoice = invoices.get(watch.invoice_id)
+            if invoice is None:
+                status = None
+            else:
+                status = invoice["status"] if isinstance(invoice, dict) else invoice.status
+                if status not in FINAL_STATUSES:
+                    continue
+            with self._condition:
+                if self._watches.pop(watch.invoice_id, None) is None:
+                    # Unwatched meanwhile
+                    continue
+            finished += 1
+            if status == "paid":
+                self._call(watch.on_paid or self.on_paid, invoice)
+            elif status == "expired":
+                self._call(watch.on_expired or self.on_expired, invoice)
+            watch.future.set_result(invoice)
+        return finished
+
+    def _call(self, callback, invoice):
+        if callback is None:
+            return
+        try:
+            callback(invoice)
+        except Exception as e:
+            self.errors += 1
+            if self.print_errors:
+                print("Payment watcher callback exception: {}".format(e))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    now = time.monotonic()
+                    next_poll = min((watch.next_poll for watch in self._watches.values()), default = None)
+                    if next_poll is not None and next_poll <= now:
+                        break
+                    self._condition.wait(None if next_poll is None else next_poll - now)
+                if self._stopped:
+                    return
+            try:
+                self.poll()
+            except pyCryptoPayException as pe:
+                # Due invoices are already rescheduled, so they are polled again after their interval
+                self.errors += 1
+                if self.print_errors:
+                    print("Payment watcher request exception: {}".format(pe.message))
+
+    def start(self):
+        """
+        Start polling in background thread.
+        """
+        with self._condition:
+            if self._thread is not None:
+                return self
+            self._stopped = False
+            self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait = True):
+        """
+        Stop polling. Watched invoices are kept and polled again after start().
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+        if wait and thread is not None:
+            thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def stats(self):
+        """
+        Return dict of watcher counters.
+        """
+        with self._condition:
+            watched = len(self._watches)
+        return {
+            "watched": watched,
+            "polls": self.polls,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
@@ -0,0 +1,249 @@
+import hashlib
+import hmac
+import json
+import queue
+import threading
+from collections import OrderedDict
+from .classes import Update
+from .api import pyCryptoPayException
+
+SIGNATURE_HEADER = "crypto-pay-api-signature"
+
+
+def _secret(api_token):
+    return hashlib.sha256(api_token.encode()).digest()
+
+
+def _signature_matches(secret, body, signature):
+    # Header comes from anyone: compare bytes, as compare_digest raises TypeError on non-ASCII strings
+    if not signature:
+        return False
+    if isinstance(signature, str):
+        signature = signature.encode("utf-8", "replace")
+    return hmac.compare_digest(hmac.new(secret, body, hashlib.sha256).hexdigest().encode(), signature)
+
+
+def sign_webhook(api_token, body):
+    """
+    Calculate webhook signature of the request body, as Crypto Pay does it.
+    Useful to build signed fixtures for tests.
+
+    :param api_token: API token of the app
+    :param body: (Bytes/String) Raw request body
+    :return: Hex signature for crypto-pay-api-signature header
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    return hmac.new(_secret(api_token), body, hashlib.sha256).hexdigest()
+
+
+def check_webhook_signature(api_token, body, signature):
+    """
+    Check webhook signature of the request body.
+
+    :param api_token: API token of the app
+    :param body: (Bytes/String) Raw request body
+    :param signature: Value of crypto-pay-api-signature header
+    :return: True if signature is valid
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    return _signature_matches(_secret(api_token), body, signature)
+
+
+class WebhookHandler:
+    """
+    Crypto Pay webhook receiver.
+    Checks signatures, drops duplicate updates and passes them to handlers via bounded queue
+    processed by worker threads. Provides WSGI and ASGI apps.
+    """
+
+    def __init__(self, api_token, result_as_class = True, workers = 4, queue_size = 10000, batch_size = 100, dedupe_size = 100000, print_errors = False):
+        """
+        Create the WebhookHandler instance.
+
+        :param api_token: API token of the app (used to check signatures)
+        :param result_as_class: (Optional) Pass Update instances to handlers, otherwise raw dicts. Default is True.
+        :param workers: (Optional) Number of worker threads calling handlers. Default is 4.
+        :param queue_size: (Optional) Max number of updates waiting for handlers. Default is 10000.
+        :param batch_size: (Optional) Max number of updates taken from queue by worker at once. Default is 100.
+        :param dedupe_size: (Optional) Number of last update IDs remembered to drop duplicates. Default is 100000.
+        :param print_errors: (Optional) Print handler exceptions
+        """
+        self._secret = _secret(api_token)
+        self.result_as_class = result_as_class
+        self.workers = workers
+        self.batch_size = batch_size
+        self.dedupe_size = dedupe_size
+        self.print_errors = print_errors
+        self.handlers = {}
+        self.processed = 0
+        self.duplicates = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize = queue_size)
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def add_handler(self, handler, update_type = "invoice_paid"):
+        """
+        Register handler(update) for the update type.
+        """
+        self.handlers.setdefault(update_type, []).append(handler)
+
+    def handler(self, update_type = "invoice_paid"):
+        """
+        Decorator version of add_handler.
+        """
+        def decorator(func):
+            self.add_handler(func, update_type)
+            return func
+        return decorator
+
+    def start(self):
+        """
+        Start worker threads.
+        """
+        if self._threads:
+            return
+        for _ in range(self.workers):
+            thread = threading.Thread(target = self._work, daemon = True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait = True):
+        """
+        Stop worker threads after queued updates are processed.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def join(self):
+        """
+        Wait until all queued updates are processed.
+        """
+        self._queue.join()
+
+    def process(self, body, signature):
+        """
+        Check and enqueue raw webhook request.
+
+        :param body: (Bytes/String) Raw request body
+        :param signature: Value of crypto-pay-api-signature header
+        :return: True if update was queued, False if it is a duplicate.
+            Raises pyCryptoPayException on wrong signature (-6), bad body (-2) or full queue (-7).
+        """
+        if isinstance(body, str):
+            body = body.encode()
+        if not _signature_matches(self._secret, body, signature):
+            raise pyCryptoPayException(-6, "SIGNATURE", "Wrong webhook signature")
+        try:
+            data = json.loads(body)
+            update_id = data["update_id"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise pyCryptoPayException(-2, "JSON", "Webhook body decode failed: {}".format(e))
+        with self._lock:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return False
+            self._seen[update_id] = True
+            if len(self._seen) > self.dedupe_size:
+                self._seen.popitem(last = False)
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            # Forget the update so the retry from Crypto Pay is accepted
+            with self._lock:
+                self._seen.pop(update_id, None)
+            raise pyCryptoPayException(-7, "QUEUE_FULL", "Webhook queue is full")
+        return True
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            # Each stop marker (None) has to be taken by a different worker
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for data in batch:
+                if data is None:
+                    stop = True
+                else:
+                    self._dispatch(data)
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _dispatch(self, data):
+        update = Update(data) if self.result_as_class else data
+        for handler in self.handlers.get(data.get("update_type"), []):
+            try:
+                handler(update)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                if self.print_errors:
+                    print("Webhook handler exception: {}".format(e))
+        with self._lock:
+            self.processed += 1
+
+    def _http_status(self, body, signature):
+        try:
+            self.process(body, signature)
+            return 200
+        except pyCryptoPayException as pe:
+            return {-6: 401, -2: 400, -7: 503}.get(pe.code, 500)
+
+    def wsgi_app(self, environ, start_response):
+        """
+        WSGI application accepting webhook POST requests.
+        """
+        if environ.get("REQUEST_METHOD") != "POST":
+            status = 405
+        else:
+            try:
+                length = int(environ.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                length = 0
+            body = environ["wsgi.input"].read(length)
+            status = self._http_status(body, environ.get("HTTP_CRYPTO_PAY_API_SIGNATURE"))
+        start_response({200: "200 OK", 400: "400 Bad Request", 401: "401 Unauthorized", 405: "405 Method Not Allowed", 503: "503 Service Unavailable"}.get(status, "500 Internal Server Error"),
+                       [("Content-Type", "text/plain"), ("Content-Length", "0")])
+        return [b""]
+
+    async def asgi_app(self, scope, receive, send):
+        """
+        ASGI application accepting webhook POST requests.
+        """
+        if scope["type"] != "http":
+            return
+        if scope.get("method") != "POST":
+            status = 405
+        else:
+            chunks = []
+            while True:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            signature = None
+            for name, value in scope.get("headers", []):
+                if name.decode("latin-1").lower() == SIGNATURE_HEADER:
+                    signature = value.decode("latin-1")
+            status = self._http_status(b"".join(chunks), signature)
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain"), (b"content-length", b"0")]})
+        await send({"type": "http.response.body", "body": b""})